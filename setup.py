@@ -24,8 +24,11 @@ setup(name='weclapp-cli',
     ],
     keywords='weclapp time records uploader',
     packages=find_packages(),
-    python_requires='>=3',
+    python_requires='>=3.7',
     install_requires=['PyYAML', 'colorama', 'coloredlogs', 'python-dateutil'],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'weclapp-cli = weclapp.bin.weclapp:main'
@@ -0,0 +1,42 @@
+import pytest
+
+from weclapp.api import WeclappAPI
+
+from mockserver import RawServer
+
+
+@pytest.fixture
+def raw_server():
+    """
+    Returns a function that starts a RawServer with the scripts
+    """
+    servers = []
+
+    def start(*scripts):
+        server = RawServer(scripts)
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def api_factory():
+    """
+    Returns a function that creates a WeclappAPI for a RawServer, the
+    APIs are closed after the test
+    """
+    apis = []
+
+    def create(server, **kwargs):
+        api = WeclappAPI(server.config(**kwargs))
+        apis.append(api)
+        return api
+
+    yield create
+
+    for api in apis:
+        api.close()
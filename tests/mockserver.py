@@ -0,0 +1,155 @@
+import socket
+import threading
+
+
+class RawConnection(object):
+    """
+    The server side of a connection accepted by RawServer
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buf = b''
+        # number of bytes sent to the client
+        self.sent = 0
+
+    def read_request(self):
+        """
+        Reads a request and returns (method, path, headers, body) or
+        None if the client closed the connection
+        """
+        while b'\r\n\r\n' not in self.buf:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                return None
+            self.buf += chunk
+
+        head, self.buf = self.buf.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        method, path, _ = lines[0].split(' ', 2)
+
+        headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        while len(self.buf) < length:
+            self.buf += self.sock.recv(65536)
+
+        body, self.buf = self.buf[:length], self.buf[length:]
+
+        return (method, path, headers, body)
+
+    def read_requests(self, count):
+        """
+        Reads count requests, returns them as a list
+        """
+        return [ self.read_request() for _ in range(count) ]
+
+    def send(self, data):
+        self.sock.sendall(data)
+        self.sent += len(data)
+
+    def close(self):
+        self.sock.close()
+
+
+def response(status=200, body=b'{}', headers=None, close=False):
+    """
+    Returns the bytes of a HTTP response with a Content-Length
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    lines = [ 'HTTP/1.1 %d X' % status, 'Content-Length: %d' % len(body) ]
+    if body:
+        lines.append('Content-Type: application/json')
+    if close:
+        lines.append('Connection: close')
+    lines += [ '%s: %s' % (key, value) for key, value in (headers or {}).items() ]
+
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+class RawServer(object):
+    """
+    A HTTP server on localhost that runs one script per accepted
+    connection. A script is a function that takes a RawConnection and
+    answers the requests byte by byte, so every detail of the responses
+    (chunks, compression, closed connections) is controlled by the test.
+    """
+
+    def __init__(self, scripts):
+        self.scripts = list(scripts)
+        self.connections = 0
+        self.accepted = []
+        self.errors = []
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        for script in self.scripts:
+            try:
+                sock, _ = self.sock.accept()
+            except OSError:
+                return
+
+            self.connections += 1
+            conn = RawConnection(sock)
+            self.accepted.append(conn)
+            threading.Thread(target=self.run, args=(script, conn), daemon=True).start()
+
+    def run(self, script, conn):
+        try:
+            script(conn)
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            conn.close()
+
+    @property
+    def sent(self):
+        """
+        The number of bytes sent to the clients
+        """
+        return sum(conn.sent for conn in self.accepted)
+
+    def config(self, **kwargs):
+        config = {
+            'domain': '127.0.0.1:%d' % self.port,
+            'path': '/api',
+            'apitoken': 'token',
+            'ssl': False,
+            'retry_backoff': 0,
+        }
+        config.update(kwargs)
+
+        return config
+
+    def close(self):
+        self.sock.close()
+
+
+def answer_then_drop(conn):
+    """
+    Answers the first request, then reads the second one and closes
+    the connection without an answer
+    """
+    conn.read_request()
+    conn.send(response(201, '{"id": "1"}'))
+    conn.read_request()
+
+
+def answer(conn):
+    """
+    Answers every request of the connection
+    """
+    while conn.read_request() is not None:
+        conn.send(response(201, '{"id": "2"}'))
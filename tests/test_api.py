@@ -0,0 +1,170 @@
+import gzip
+import json
+import codecs
+import time
+import urllib.parse
+
+import pytest
+
+from weclapp.api import WeclappError, ResultDecoder
+from weclapp.models import WeclappTimeRecord
+from weclapp.models.base import WeclappBaseModel
+
+from mockserver import response, answer, answer_then_drop
+
+
+def test_post_is_not_resent_when_the_connection_drops_after_sending(raw_server, api_factory):
+    server = raw_server(answer_then_drop, answer)
+    api = api_factory(server)
+
+    assert api.call('timeRecord', 'POST', body='{}', expected_status_code=201) == { 'id': '1' }
+
+    with pytest.raises(WeclappError):
+        api.call('timeRecord', 'POST', body='{}', expected_status_code=201)
+
+    # the POST might have been processed, so it was not sent again
+    assert server.connections == 1
+
+
+def test_get_is_resent_when_the_connection_drops_after_sending(raw_server, api_factory):
+    server = raw_server(answer_then_drop, answer)
+    api = api_factory(server)
+
+    assert api.call('timeRecord', 'GET', expected_status_code=201) == { 'id': '1' }
+    assert api.call('timeRecord', 'GET', expected_status_code=201) == { 'id': '2' }
+    assert server.connections == 2
+
+
+def test_post_uses_a_new_connection_when_the_idle_one_was_closed(raw_server, api_factory):
+    def answer_and_close(conn):
+        conn.read_request()
+        conn.send(response(201, '{"id": "1"}'))
+
+    server = raw_server(answer_and_close, answer)
+    api = api_factory(server)
+
+    assert api.call('timeRecord', 'POST', body='{}', expected_status_code=201) == { 'id': '1' }
+
+    # the server closes the idle keep-alive connection
+    time.sleep(0.1)
+
+    assert api.call('timeRecord', 'POST', body='{}', expected_status_code=201) == { 'id': '2' }
+    assert server.connections == 2
+
+
+def chunked(data, size):
+    """
+    Returns data in the chunked transfer encoding with chunks of size bytes
+    """
+    parts = [ b'%x\r\n%s\r\n' % (len(data[i:i + size]), data[i:i + size]) for i in range(0, len(data), size) ]
+    return b''.join(parts) + b'0\r\n\r\n'
+
+
+def test_keep_alive_connection_is_reused(raw_server, api_factory):
+    server = raw_server(answer)
+    api = api_factory(server)
+
+    for _ in range(3):
+        assert api.call('timeRecord', 'GET', expected_status_code=201) == { 'id': '2' }
+
+    assert server.connections == 1
+
+
+def test_chunked_gzip_response_is_decoded(raw_server, api_factory):
+    payload = json.dumps({ 'result': [ { 'id': str(i), 'description': 'record %d' % i } for i in range(200) ] })
+    requests = []
+
+    def gzip_chunked(conn):
+        requests.append(conn.read_request())
+
+        body = gzip.compress(payload.encode('utf-8'))
+        conn.send(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Encoding: gzip\r\n'
+                b'Transfer-Encoding: chunked\r\n\r\n' + chunked(body, 100))
+
+        requests.append(conn.read_request())
+        conn.send(response(200, '{"result": 1}'))
+
+    server = raw_server(gzip_chunked)
+    api = api_factory(server)
+
+    assert api.call('timeRecord', 'GET') == json.loads(payload)
+    assert 'gzip' in requests[0][2]['accept-encoding']
+
+    # the connection is still usable after the chunked response
+    assert api.call('timeRecord/count', 'GET') == { 'result': 1 }
+    assert server.connections == 1
+
+
+def full_time_record(i):
+    """
+    A time record with all the fields returned by the public API
+    """
+    return {
+        'id': str(i), 'billable': False, 'projectId': '12', 'projectTaskId': '13', 'userId': '14',
+        'durationSeconds': 3600, 'createdDate': 1550000000000, 'lastModifiedDate': 1550000000000,
+        'startDate': 1550000000000, 'description': 'record %d' % i, 'version': '1',
+        'customAttributes': [], 'billableDurationSeconds': 3600, 'billingStatus': 'NOT_BILLED',
+        'hourlyRate': { 'amount': '0', 'currencyId': '1' }, 'placeOfService': None,
+        'salesOrderItemId': None, 'ticketId': None, 'travelTimeDurationSeconds': None,
+        'userName': 'someone@example.com', 'workPlaceName': None,
+    }
+
+
+def test_models_fetch_only_their_fields(raw_server, api_factory, monkeypatch):
+    queries = []
+
+    def entities(conn):
+        while True:
+            request = conn.read_request()
+            if request is None:
+                return
+
+            url = urllib.parse.urlsplit(request[1])
+            query = dict(urllib.parse.parse_qsl(url.query))
+            queries.append(query)
+
+            records = [ full_time_record(i) for i in range(int(query.get('pageSize', 100))) ]
+            if 'properties' in query:
+                fields = query['properties'].split(',')
+                records = [ { key: r[key] for key in fields } for r in records ]
+
+            conn.send(response(200, json.dumps({ 'result': records })))
+
+    server = raw_server(entities)
+    monkeypatch.setattr(WeclappBaseModel, '__api__', api_factory(server))
+
+    records = WeclappTimeRecord.load(pageSize=100)
+
+    assert len(records) == 100
+    assert queries[0]['properties'] == WeclappTimeRecord.__properties__
+    assert 'serializeNulls' not in queries[0]
+
+    full = len(json.dumps({ 'result': [ full_time_record(i) for i in range(100) ] }))
+    assert server.sent < full / 2
+
+
+@pytest.mark.parametrize('document, items, fields', [
+    ('{"result": [1.5e3, 2.25, -7, 0, 10]}', [ 1500.0, 2.25, -7, 0, 10 ], {}),
+    ('{"count": 12.5, "result": [{"a": 1e-2, "b": "ä"}, "x", true, null], "n": -3E+2}',
+            [ { 'a': 0.01, 'b': 'ä' }, 'x', True, None ], { 'count': 12.5, 'n': -300.0 }),
+    ('{"result": [], "total": 2.}', None, None),
+])
+def test_result_decoder_fed_one_byte_at_a_time(document, items, fields):
+    text = codecs.getincrementaldecoder('utf-8')()
+    decoder = ResultDecoder()
+
+    def decode():
+        decoded = []
+        for byte in document.encode('utf-8'):
+            decoded += decoder.feed(text.decode(bytes([ byte ])))
+        decoded += decoder.feed(text.decode(b'', final=True), final=True)
+        return decoded
+
+    if items is None:
+        # invalid JSON
+        with pytest.raises(json.JSONDecodeError):
+            decode()
+        return
+
+    assert decode() == items
+    assert decoder.fields == fields
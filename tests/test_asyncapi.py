@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from weclapp.api import WeclappError
+from weclapp.asyncapi import AsyncWeclappAPI
+
+from mockserver import answer, answer_then_drop, response
+
+
+def run(server, coroutine, **kwargs):
+    """
+    Runs coroutine(api) with an AsyncWeclappAPI for the server
+    """
+    async def main():
+        api = AsyncWeclappAPI(server.config(**kwargs))
+        try:
+            return await coroutine(api)
+        finally:
+            api.close()
+
+    return asyncio.run(main())
+
+
+def test_post_is_not_resent_when_the_connection_drops_after_sending(raw_server):
+    server = raw_server(answer_then_drop, answer)
+
+    async def calls(api):
+        assert await api.call('timeRecord', 'POST', body='{}', expected_status_code=201) == { 'id': '1' }
+
+        with pytest.raises(WeclappError):
+            await api.call('timeRecord', 'POST', body='{}', expected_status_code=201)
+
+    run(server, calls)
+
+    assert server.connections == 1
+
+
+def test_get_is_resent_when_the_connection_drops_after_sending(raw_server):
+    server = raw_server(answer_then_drop, answer)
+
+    async def calls(api):
+        assert await api.call('timeRecord', 'GET', expected_status_code=201) == { 'id': '1' }
+        assert await api.call('timeRecord', 'GET', expected_status_code=201) == { 'id': '2' }
+
+    run(server, calls)
+
+    assert server.connections == 2
+
+
+def test_post_uses_a_new_connection_when_the_idle_one_was_closed(raw_server):
+    def answer_and_close(conn):
+        conn.read_request()
+        conn.send(response(201, '{"id": "1"}'))
+
+    server = raw_server(answer_and_close, answer)
+
+    async def calls(api):
+        assert await api.call('timeRecord', 'POST', body='{}', expected_status_code=201) == { 'id': '1' }
+
+        # the server closes the idle keep-alive connection
+        await asyncio.sleep(0.1)
+
+        assert await api.call('timeRecord', 'POST', body='{}', expected_status_code=201) == { 'id': '2' }
+
+    run(server, calls)
+
+    assert server.connections == 2
+
+
+def bodies(count):
+    return [ '{"n": %d}' % n for n in range(count) ]
+
+
+def answer_batch(count, answered, last=b''):
+    """
+    Returns a script that reads count pipelined requests before it
+    answers the first answered of them with their position and sends
+    last after them
+    """
+    def script(conn):
+        conn.read_requests(count)
+        for n in range(answered):
+            conn.send(response(201, '{"id": "%d"}' % n))
+        conn.send(last)
+
+    return script
+
+
+def test_batch_is_pipelined_over_one_connection(raw_server):
+    server = raw_server(answer_batch(5, 5), answer)
+
+    results = run(server, lambda api: api.call_batch('timeRecord', 'POST', bodies(5), expected_status_code=201))
+
+    assert results == [ { 'id': str(n) } for n in range(5) ]
+    assert server.connections == 1
+
+
+def test_batch_resends_the_posts_after_connection_close(raw_server):
+    def answer_and_close(conn):
+        conn.read_requests(5)
+        conn.send(response(201, '{"id": "0"}'))
+        conn.send(response(201, '{"id": "1"}', close=True))
+
+    server = raw_server(answer_and_close, answer)
+
+    results = run(server, lambda api: api.call_batch('timeRecord', 'POST', bodies(5), expected_status_code=201))
+
+    assert results == [ { 'id': '0' }, { 'id': '1' } ] + [ { 'id': '2' } ] * 3
+    assert server.connections == 2
+
+
+@pytest.mark.parametrize('last', [
+    # truncated body
+    b'HTTP/1.1 201 X\r\nContent-Length: 20\r\n\r\n{"id"',
+    b'garbage\r\n\r\n',
+    # invalid chunk size
+    b'HTTP/1.1 201 X\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n',
+])
+def test_batch_keeps_the_answers_before_a_broken_response(raw_server, last):
+    server = raw_server(answer_batch(5, 2, last), answer)
+
+    results = run(server, lambda api: api.call_batch('timeRecord', 'POST', bodies(5), expected_status_code=201))
+
+    assert results[:2] == [ { 'id': '0' }, { 'id': '1' } ]
+    for res in results[2:]:
+        assert isinstance(res, WeclappError)
+        assert 'might have been processed' in str(res)
+
+    # the posts without an answer are not sent again
+    assert server.connections == 1
+
+
+def test_batch_posts_are_not_resent_when_a_reused_connection_drops(raw_server):
+    def answer_then_drop_batch(conn):
+        conn.read_request()
+        conn.send(response(201, '{"id": "0"}'))
+        conn.read_requests(3)
+
+    server = raw_server(answer_then_drop_batch, answer)
+
+    async def calls(api):
+        assert await api.call('timeRecord', 'POST', body='{}', expected_status_code=201) == { 'id': '0' }
+        return await api.call_batch('timeRecord', 'POST', bodies(3), expected_status_code=201)
+
+    results = run(server, calls)
+
+    assert all(isinstance(res, WeclappError) for res in results)
+    assert server.connections == 1
+
+
+def test_batch_gets_are_resent(raw_server):
+    server = raw_server(answer_batch(3, 1), answer)
+
+    results = run(server, lambda api: api.call_batch('timeRecord', 'GET', [ None ] * 3, expected_status_code=201))
+
+    assert results == [ { 'id': '0' }, { 'id': '2' }, { 'id': '2' } ]
+    assert server.connections == 2
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+
+from weclapp.models import columns as module
+from weclapp.models.columns import TimeRecordColumns
+
+DAY = 24 * 3600 * 1000
+
+
+def rows(count):
+    """
+    Returns count time records spread over a few projects, tasks,
+    users and days
+    """
+    start = int(datetime(2019, 3, 1, 9).timestamp() * 1000)
+
+    return [ {
+        'id': str(n),
+        'durationSeconds': 60 * (n % 7 + 1),
+        'startDate': start + (n % 5) * DAY + (n % 3) * 3600 * 1000,
+        'projectId': 'p%d' % (n % 3),
+        'projectTaskId': 't%d' % (n % 4),
+        'userId': 'u%d' % (n % 2),
+    } for n in range(count) ]
+
+
+def expected_sums(records, *keys):
+    fields = { 'project': 'projectId', 'task': 'projectTaskId', 'user': 'userId' }
+
+    totals = {}
+    for row in records:
+        group = tuple(datetime.fromtimestamp(row['startDate'] // 1000).date() if key == 'day' else row[fields[key]]
+                for key in keys)
+        if len(keys) == 1:
+            group = group[0]
+        totals[group] = totals.get(group, 0) + row['durationSeconds']
+
+    return totals
+
+
+KEYS = [ ('project',), ('day',), ('project', 'task'), ('user', 'day', 'task') ]
+
+
+def sum_python(records, keys):
+    """
+    Returns the sums of the pure Python path, without NumPy
+    """
+    columns = TimeRecordColumns.from_rows(records)
+
+    numpy = module.numpy
+    module.numpy = None
+    try:
+        return columns.sum_by(*keys)
+    finally:
+        module.numpy = numpy
+
+
+@pytest.mark.parametrize('keys', KEYS)
+def test_sum_by(keys):
+    records = rows(100)
+
+    assert sum_python(records, keys) == expected_sums(records, *keys)
+
+
+@pytest.mark.parametrize('keys', KEYS)
+def test_sum_by_numpy_matches_python(keys):
+    pytest.importorskip('numpy')
+
+    records = rows(100)
+
+    assert TimeRecordColumns.from_rows(records).sum_by(*keys) == sum_python(records, keys)
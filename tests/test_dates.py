@@ -0,0 +1,66 @@
+from datetime import date
+
+import pytest
+
+from weclapp.parser import CSVParser
+from weclapp.parser.dates import DateParser, LOOKAHEAD_ROWS
+
+
+def write_csv(path, days):
+    lines = [ 'PROJECT ID;1;', 'TASK ID;2;' ]
+    lines += [ '%s;1;' % day for day in days ]
+    path.write_text('\n'.join(lines) + '\n')
+
+    return str(path)
+
+
+def record_days(records):
+    return [ r.startDate.date() for r in records ]
+
+
+def test_day_first_is_detected_before_the_ambiguous_dates_are_parsed(tmp_path, capsys):
+    fn = write_csv(tmp_path / 'times.csv', [ '01.02.2019', '05.02.2019', '13.02.2019', '01.03.2019' ])
+
+    records = CSVParser().parseFile(fn)
+
+    assert record_days(records) == [ date(2019, 2, 1), date(2019, 2, 5), date(2019, 2, 13), date(2019, 3, 1) ]
+    assert capsys.readouterr().err == ''
+
+
+def test_ambiguous_dates_are_reported(tmp_path, capsys):
+    fn = write_csv(tmp_path / 'times.csv', [ '01.02.2019', '02.02.2019' ])
+
+    records = CSVParser().parseFile(fn)
+
+    # month first like dateutil
+    assert record_days(records) == [ date(2019, 1, 2), date(2019, 2, 2) ]
+    assert 'match several formats' in capsys.readouterr().err
+
+
+def test_dates_after_the_lookahead_that_contradict_the_format_are_reported(tmp_path, capsys):
+    days = [ '01.%02d.2019' % (i % 12 + 1) for i in range(LOOKAHEAD_ROWS) ] + [ '13.01.2019' ]
+    fn = write_csv(tmp_path / 'times.csv', days)
+
+    records = CSVParser().parseFile(fn)
+
+    assert len(records) == LOOKAHEAD_ROWS
+    assert 'line %d' % (LOOKAHEAD_ROWS + 3) in capsys.readouterr().err
+
+
+def test_the_format_does_not_change_while_parsing():
+    dates = DateParser()
+    assert dates.detect([ '01.02.2019', '02.03.2019' ]) == '%m.%d.%Y'
+
+    assert dates.parse('01.03.2019') == date(2019, 1, 3)
+    with pytest.raises(ValueError):
+        dates.parse('13.02.2019')
+    assert dates.parse('01.03.2019') == date(2019, 1, 3)
+    assert dates.fmt == '%m.%d.%Y'
+
+
+def test_values_without_a_known_format_are_parsed_with_dateutil():
+    dates = DateParser()
+    assert dates.detect([ 'Tuesday, 01/ Jan 2019', '2019-01-02' ]) == '%Y-%m-%d'
+
+    assert dates.parse('2019-01-03') == date(2019, 1, 3)
+    assert dates.parse('Friday, 04/ Jan 2019') == date(2019, 1, 4)
@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+
+import pytest
+
+from weclapp.models import WeclappTimeRecord, WeclappTask, WeclappProject
+
+COUNT = 10000
+
+ROW = {
+    'id': '1',
+    'billable': False,
+    'projectId': '12',
+    'projectTaskId': '13',
+    'userId': '14',
+    'durationSeconds': 3600,
+    'createdDate': 1550000000000,
+    'lastModifiedDate': 1550000000000,
+    'startDate': 1550000000000,
+    'description': 'some description',
+}
+
+
+def test_time_records_are_small():
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        records = [ WeclappTimeRecord(**ROW) for _ in range(COUNT) ]
+        size = (tracemalloc.get_traced_memory()[0] - before) / COUNT
+    finally:
+        tracemalloc.stop()
+
+    # about 190 bytes on CPython 3.11
+    assert size < 300
+    assert len(records) == COUNT
+
+
+def test_time_records_keep_their_attributes_in_slots():
+    record = WeclappTimeRecord(**ROW)
+
+    # the __dict__ is only meant for the attributes of parsers
+    assert vars(record) == {}
+
+
+def test_creating_time_records_is_fast():
+    start = time.perf_counter()
+    for _ in range(COUNT):
+        WeclappTimeRecord(**ROW)
+    elapsed = time.perf_counter() - start
+
+    # about 0.05 seconds, the bound leaves room for slow machines
+    assert elapsed < 1.0
+
+
+def test_timestamps_are_converted_on_first_access():
+    record = WeclappTimeRecord(**ROW)
+
+    assert record.millis('startDate') == ROW['startDate']
+    assert record.startDate.timestamp() == ROW['startDate'] / 1000
+
+
+@pytest.mark.parametrize('klass', [ WeclappTask, WeclappProject ])
+def test_models_have_no_dict(klass):
+    assert '__dict__' not in dir(klass)
+
+
+def test_parsers_can_set_their_own_attributes():
+    record = WeclappTimeRecord(**ROW)
+    record.my_attribute = 'x'
+
+    assert record.my_attribute == 'x'
@@ -0,0 +1,108 @@
+import json
+import urllib.parse
+
+import pytest
+
+from weclapp.models import WeclappProject, WeclappTask, WeclappTimeRecord
+from weclapp.models.base import WeclappBaseModel, IN_FILTER_CHUNK_SIZE
+
+PROJECTS = 600
+TASKS_PER_PROJECT = 2
+RECORDS_PER_TASK = 2
+
+
+class FakeAPI(object):
+    """
+    Answers the API calls of the models out of lists of entities. It
+    supports the -in and -ilike filters, sort, page and pageSize and
+    remembers the URLs of the calls.
+    """
+
+    def __init__(self, entities):
+        self.entities = entities
+        self.urls = []
+
+    def select(self, command, query):
+        self.urls.append('/%s?%s' % (command, urllib.parse.urlencode(query)))
+
+        rows = self.entities[command]
+        for key, value in query.items():
+            if key.endswith('-in'):
+                accepted = set(json.loads(value))
+                rows = [ r for r in rows if r[key[:-3]] in accepted ]
+            elif key.endswith('-ilike'):
+                text = value.strip('%').lower()
+                rows = [ r for r in rows if text in r[key[:-6]].lower() ]
+
+        return rows
+
+    def call(self, command, method, query={}, body=None, expected_status_code=200):
+        assert command.endswith('/count')
+        return { 'result': len(self.select(command[:-len('/count')], query)) }
+
+    def stream(self, command, method='GET', query={}, expected_status_code=200):
+        rows = self.select(command, query)
+
+        sort = query.get('sort', None)
+        if sort:
+            rows = sorted(rows, key=lambda r: r[sort.lstrip('-')], reverse=sort.startswith('-'))
+
+        start = (query['page'] - 1) * query['pageSize']
+        return iter(rows[start:start + query['pageSize']])
+
+
+@pytest.fixture
+def api(monkeypatch):
+    projects = [ { 'id': 'p%d' % i, 'name': 'Project %d' % i, 'projectNumber': 'P-%04d' % i, 'billable': True }
+            for i in range(PROJECTS) ]
+    tasks = [ { 'id': '%s-t%d' % (p['id'], j), 'name': 'Task %d' % j, 'projectId': p['id'], 'allowTimeTracking': True }
+            for p in projects for j in range(TASKS_PER_PROJECT) ]
+    records = [ { 'id': '%s-r%d' % (t['id'], k), 'projectId': t['projectId'], 'projectTaskId': t['id'],
+            'durationSeconds': 3600, 'startDate': 1550000000000 + 1000 * (n * RECORDS_PER_TASK + k) }
+            for n, t in enumerate(tasks) for k in range(RECORDS_PER_TASK) ]
+
+    fake = FakeAPI({ 'project': projects, 'projectTask': tasks, 'timeRecord': records })
+    monkeypatch.setattr(WeclappBaseModel, '__api__', fake)
+
+    return fake
+
+
+def in_filter_sizes(urls):
+    sizes = []
+    for url in urls:
+        for key, value in urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query):
+            if key.endswith('-in'):
+                sizes.append(len(json.loads(value)))
+
+    return sizes
+
+
+def test_load_in_splits_large_id_lists(api):
+    ids = [ 'p%d' % i for i in range(PROJECTS) ]
+
+    tasks = WeclappTask.load_in('projectId', ids, concurrency=4)
+
+    assert len(tasks) == PROJECTS * TASKS_PER_PROJECT
+    assert max(in_filter_sizes(api.urls)) == IN_FILTER_CHUNK_SIZE
+    assert max(len(url) for url in api.urls) < 4096
+
+
+def test_load_in_returns_the_first_objects_of_all_chunks(api):
+    ids = [ '%s-t%d' % ('p%d' % i, j) for i in range(PROJECTS) for j in range(TASKS_PER_PROJECT) ]
+
+    records = WeclappTimeRecord.load_in('projectTaskId', ids, sort='-startDate', pageSize=10)
+
+    expected = sorted(api.entities['timeRecord'], key=lambda r: r['startDate'], reverse=True)[:10]
+    assert [ r.id for r in records ] == [ r['id'] for r in expected ]
+
+
+def test_broad_matches_keep_the_urls_short(api):
+    # every project matches
+    projects = WeclappProject.load_matching('task', time_records=-1, concurrency=4)
+
+    assert len(projects) == PROJECTS
+    assert sum(len(p.tasks) for p in projects) == PROJECTS * TASKS_PER_PROJECT
+    assert sum(len(t.time_records) for p in projects for t in p.tasks) == len(api.entities['timeRecord'])
+
+    assert max(in_filter_sizes(api.urls)) <= IN_FILTER_CHUNK_SIZE
+    assert max(len(url) for url in api.urls) < 4096
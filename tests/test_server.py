@@ -0,0 +1,83 @@
+import os
+import socket
+import threading
+
+import pytest
+
+from weclapp.server import Server, DaemonFailed, send_request
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """
+    Returns a function that runs a Server with the handler in a thread
+    and returns the path of its socket
+    """
+    servers = []
+
+    def start(handler):
+        path = str(tmp_path / 'weclapp-cli.sock')
+        server = Server(path, handler)
+        server.listen()
+        servers.append(server)
+
+        def run():
+            try:
+                server.serve_forever()
+            except OSError:
+                # stopped by the fixture
+                pass
+
+        threading.Thread(target=run, daemon=True).start()
+
+        return path
+
+    yield start
+
+    for server in servers:
+        server.sock.shutdown(socket.SHUT_RDWR)
+
+
+def test_requests_are_answered(serve):
+    path = serve(lambda request: { 'status': request['value'] })
+
+    assert send_request(path, { 'value': 3 }) == { 'status': 3 }
+
+
+def test_handler_errors_are_answered(serve):
+    def handler(request):
+        return { 'status': request['missing'] }
+
+    path = serve(handler)
+
+    response = send_request(path, {})
+    assert response['status'] == 1
+    assert 'missing' in response['error']
+
+    # the daemon keeps running
+    assert send_request(path, {})['status'] == 1
+
+
+def test_listen_replaces_a_stale_socket(tmp_path):
+    path = str(tmp_path / 'weclapp-cli.sock')
+
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+
+    server = Server(path, lambda request: {})
+    server.listen()
+    server.close()
+
+    assert not os.path.exists(path)
+
+
+def test_listen_refuses_other_files(tmp_path):
+    path = tmp_path / 'config.yml'
+    path.write_text('domain: example.com\n')
+
+    server = Server(str(path), lambda request: {})
+    with pytest.raises(DaemonFailed):
+        server.listen()
+
+    assert path.read_text() == 'domain: example.com\n'
@@ -0,0 +1,52 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that only the commands need
+HEAVY = [ 'yaml', 'dateutil', 'coloredlogs', 'asyncio', 'sqlite3', 'http.client',
+        'weclapp.api', 'weclapp.models.base', 'weclapp.modules.base' ]
+
+
+def imported_modules(code):
+    """
+    Runs code with python -X importtime and returns a dictionary
+    module -> cumulative import time in microseconds
+    """
+    proc = subprocess.run([ sys.executable, '-X', 'importtime', '-c', code ], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+
+    return modules
+
+
+@pytest.mark.parametrize('code', [
+    'import weclapp',
+    'import sys; sys.argv = [ "weclapp-cli", "-v" ]; from weclapp.bin.weclapp import main; main()',
+])
+def test_startup_does_not_import_heavy_modules(code):
+    modules = imported_modules(code)
+
+    assert [ name for name in HEAVY if name in modules ] == []
+
+    # about 3 ms, the bound leaves room for slow machines
+    assert modules['weclapp'] < 500000
+
+
+def test_star_import_exports_the_lazy_classes():
+    names = {}
+    exec('from weclapp import *', names)
+
+    for name in [ 'Parser', 'CSVParser', 'add_parser', 'WeclappTimeRecord', 'Config', 'FailedToParse' ]:
+        assert name in names
@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+from weclapp.models import WeclappTask
+from weclapp.models.base import WeclappBaseModel
+from weclapp.store import SyncStore
+
+TASKS = 1200
+
+
+class FakeAPI(object):
+    """
+    Answers the page and count calls of the tasks. It supports the
+    -ge and -in filters, sort and properties. on_page is called after
+    every page, so entities can be changed while a sync is running.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.on_page = None
+        self.pages = 0
+
+    def select(self, query):
+        rows = list(self.tasks.values())
+        for key, value in query.items():
+            if key.endswith('-ge'):
+                rows = [ r for r in rows if r[key[:-3]] >= value ]
+            elif key.endswith('-in'):
+                accepted = set(json.loads(value))
+                rows = [ r for r in rows if r[key[:-3]] in accepted ]
+
+        return rows
+
+    def call(self, command, method, query={}, body=None, expected_status_code=200):
+        assert command == 'projectTask/count'
+        return { 'result': len(self.select(query)) }
+
+    def stream(self, command, method='GET', query={}, expected_status_code=200):
+        rows = self.select(query)
+
+        sort = query.get('sort', None)
+        if sort:
+            rows = sorted(rows, key=lambda r: r[sort.lstrip('-')], reverse=sort.startswith('-'))
+
+        start = (query['page'] - 1) * query['pageSize']
+        fields = query['properties'].split(',')
+        page = [ { k: r[k] for k in fields if k in r } for r in rows[start:start + query['pageSize']] ]
+
+        self.pages += 1
+        if self.on_page is not None:
+            self.on_page(self)
+
+        return iter(page)
+
+    def modify(self, id, name):
+        task = self.tasks[id]
+        task['name'] = name
+        task['lastModifiedDate'] = max(t['lastModifiedDate'] for t in self.tasks.values()) + 1
+
+
+@pytest.fixture
+def api(monkeypatch):
+    tasks = { 't%04d' % i: { 'id': 't%04d' % i, 'name': 'Task %d' % i, 'projectId': 'p1',
+            'allowTimeTracking': True, 'lastModifiedDate': 1000 + i } for i in range(TASKS) }
+
+    fake = FakeAPI(tasks)
+    monkeypatch.setattr(WeclappBaseModel, '__api__', fake)
+
+    return fake
+
+
+@pytest.fixture
+def store():
+    store = SyncStore(':memory:')
+    yield store
+    store.close()
+
+
+def names(store):
+    return { t.id: t.name for t in store.load(WeclappTask) }
+
+
+def expected_names(api):
+    return { i: t['name'] for i, t in api.tasks.items() }
+
+
+def test_sync_keeps_entities_modified_while_syncing(api, store):
+    store.sync([ WeclappTask ])
+
+    # more changes than fit on a page
+    for i in range(700):
+        api.modify('t%04d' % i, 'Changed %d' % i)
+
+    def modify_first(api):
+        # sorted by lastModifiedDate, this would shift the next pages
+        if api.pages == 1:
+            api.modify('t0000', 'Changed again')
+
+    api.pages = 0
+    api.on_page = modify_first
+    store.sync([ WeclappTask ])
+    api.on_page = None
+
+    assert names(store) == expected_names(api)
+
+    # nothing was skipped, the next sync has nothing to fix
+    api.modify('t1000', 'Changed later')
+    store.sync([ WeclappTask ])
+
+    assert names(store) == expected_names(api)
+
+
+def test_watermark_is_kept_while_entities_keep_changing(api, store):
+    api.on_page = lambda api: api.modify('t%04d' % (api.pages % TASKS), 'Changed %d' % api.pages)
+    store.sync([ WeclappTask ])
+    api.on_page = None
+
+    assert store._meta(WeclappTask)[0] is None
+
+    store.sync([ WeclappTask ])
+
+    assert names(store) == expected_names(api)
+
+
+def test_reconciliation_fetches_missing_and_removes_deleted_entities(api, store):
+    store.sync([ WeclappTask ])
+
+    with store.conn:
+        store.conn.execute('DELETE FROM projectTask WHERE id IN (?, ?)', ('t0003', 't0700'))
+    del api.tasks['t0005']
+
+    store.sync([ WeclappTask ], reconcile=True)
+
+    assert names(store) == expected_names(api)
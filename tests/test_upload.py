@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from weclapp.models import WeclappTimeRecord
+from weclapp.modules.upload import UploadModule
+from weclapp.parser import CSVParser, Parser, FailedToParse
+
+
+class FailingParser(Parser):
+    """
+    Yields two records, then fails
+    """
+
+    def parseFile(self, filename):
+        return list(self.iterFile(filename))
+
+    def iterFile(self, filename):
+        for line in (3, 4):
+            record = WeclappTimeRecord(projectId='1', projectTaskId='2', durationSeconds=3600,
+                    startDate=1550000000000, description='')
+            record.source = (filename, line)
+            yield record
+
+        raise FailedToParse('[%s] Line 5 is broken' % filename)
+
+
+def write_csv(path, rows):
+    path.write_text('\n'.join([ 'PROJECT ID;1;', 'TASK ID;2;' ] + rows) + '\n')
+    return str(path)
+
+
+def iter_records(parser, files, jobs):
+    """
+    Returns (sources of the records, failed files) of the upload
+    module's iter_records()
+    """
+    module = UploadModule(None, SimpleNamespace(files=files, jobs=jobs, nocolor=True), {})
+    module.failed_files = []
+    module.progress = None
+
+    sources = [ record.source for record in module.iter_records(parser) ]
+
+    return (sources, module.failed_files)
+
+
+@pytest.mark.parametrize('jobs', [ 1, 2 ])
+def test_invalid_rows_are_ignored(tmp_path, capfd, jobs):
+    bad = write_csv(tmp_path / 'bad.csv', [ '2019-02-01;1;', '2019-02-02;1;', '2019-02-03;1;x;y;z', '2019-02-04;1;' ])
+    good = write_csv(tmp_path / 'good.csv', [ '2019-02-01;1;' ])
+
+    sources, failed = iter_records(CSVParser(), [ bad, good ], jobs)
+
+    assert sources == [ (bad, 3), (bad, 4), (bad, 6), (good, 3) ]
+    assert failed == []
+    assert 'Line 5 has insufficient data' in capfd.readouterr().err
+
+
+@pytest.mark.parametrize('jobs', [ 1, 2 ])
+def test_records_before_a_failure_are_uploaded_and_counted(tmp_path, capfd, jobs):
+    files = [ str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv') ]
+
+    sources, failed = iter_records(FailingParser(), files, jobs)
+
+    assert sources == [ (fn, line) for fn in files for line in (3, 4) ]
+    assert failed == files
+    assert capfd.readouterr().err.count('the 2 time records before the error are uploaded') == 2
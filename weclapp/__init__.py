@@ -2,7 +2,22 @@ from .config.config import Config
 from .config.exceptions import *
 from .exception import WeclappBaseException
 from .models.exceptions import *
-from .models import WeclappProject, WeclappTask, WeclappTimeRecord
-from .models.exceptions import *
 from .parser.exceptions import *
-from .parser import Parser, add_parser, CSVParser
+from .store.exceptions import *
+from .lazy import lazy_attributes
+
+_lazy = {
+    'WeclappProject': '.models',
+    'WeclappTask': '.models',
+    'WeclappTimeRecord': '.models',
+    'TimeRecordColumns': '.models',
+    'Parser': '.parser',
+    'add_parser': '.parser',
+    'CSVParser': '.parser',
+    'SyncStore': '.store',
+    'UploadJournal': '.store',
+}
+
+__getattr__ = lazy_attributes(__name__, _lazy)
+__all__ = [ 'Config', 'WeclappBaseException' ] + config.exceptions.__all__ + models.exceptions.__all__ \
+        + parser.exceptions.__all__ + store.exceptions.__all__ + list(_lazy)
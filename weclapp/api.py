@@ -1,18 +1,476 @@
 import http.client
 import urllib.parse
+import email.utils
+import threading
+import select
+import codecs
+import random
+import time
 import copy
 import json
+import zlib
 import logging
 
 from . import WeclappBaseException
+from .config import Config
 
 log = logging.getLogger("weclapp-cli")
 
+CHUNK_SIZE = 64 * 1024
+
+# the characters a JSON number starts with and consists of
+NUMBER_START = '-0123456789'
+NUMBER_CHARS = '0123456789+-.eE'
+
 class WeclappError(WeclappBaseException):
-    pass
+    """
+    Raised when an API call fails. status is the HTTP status code
+    of the response, None if no response was received
+    """
+
+    def __init__(self, *args, status=None):
+        super().__init__(*args)
+        self.status = status
+
+
+class ConnectionPool(object):
+    """
+    A thread safe pool of HTTP/1.1 keep-alive connections for
+    a (domain, ssl) pair.
+
+    At most maxsize connections are handed out at the same time,
+    further callers block until a connection is released.
+    """
+
+    def __init__(self, domain, maxsize, ssl=True):
+        if ssl:
+            self.klass = http.client.HTTPSConnection
+        else:
+            self.klass = http.client.HTTPConnection
+
+        self.domain = domain
+        self.maxsize = max(1, maxsize)
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxsize)
+
+    def acquire(self):
+        """
+        Returns a tuple (conn, reused). reused is True when the
+        connection has been used before and might have been closed
+        by the server in the meantime.
+        """
+        self._slots.acquire()
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn = self._idle.pop()
+
+            if not self.dropped(conn):
+                return (conn, True)
+
+            log.debug('Keep-alive connection was closed by the server')
+            conn.close()
+
+        try:
+            return (self.klass(self.domain), False)
+        except:
+            self._slots.release()
+            raise
+
+    @staticmethod
+    def dropped(conn):
+        """
+        Returns True if the server closed the idle connection. An idle
+        connection is readable only when it was closed (or the server
+        sent something unexpected), either way it can't be used.
+        """
+        if conn.sock is None:
+            return False
+
+        try:
+            readable, _, _ = select.select([ conn.sock ], [], [], 0)
+        except (OSError, ValueError):
+            return True
+
+        return len(readable) > 0
+
+    def release(self, conn, reuse=True):
+        """
+        Gives the connection back to the pool. If reuse is False,
+        the connection is closed.
+        """
+        try:
+            if reuse:
+                with self._lock:
+                    self._idle.append(conn)
+            else:
+                conn.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for conn in idle:
+            conn.close()
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when a failed API call is sent again.
+
+    Idempotent calls are retried on connection errors and on the status
+    codes in retry_status_codes. Other calls (POST) are only retried when
+    the server rejected the request without processing it (429, 503),
+    otherwise a record could be created twice.
+    """
+
+    retry_status_codes = (429, 502, 503, 504)
+    rejected_status_codes = (429, 503)
+    idempotent_methods = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+    def __init__(self, max_attempts, backoff, max_backoff=30):
+        """
+        params:
+
+            max_attempts  maximal number of attempts, 1 disables retries
+            backoff       the delay in seconds before the first retry, it is doubled
+                          on every further retry
+            max_backoff   the maximal delay in seconds (unless the server sends
+                          a Retry-After header)
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def should_retry(self, attempt, method, status=None):
+        """
+        attempt is the number of the failed attempt (starting at 1),
+        status is None when no response was received
+        """
+        if attempt >= self.max_attempts:
+            return False
+
+        if status in self.rejected_status_codes:
+            return True
+
+        if method not in self.idempotent_methods:
+            return False
+
+        return status is None or status in self.retry_status_codes
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns the seconds to wait before the next attempt. The
+        exponential backoff is jittered so that concurrent callers
+        don't retry at the same time.
+        """
+        if retry_after is not None:
+            return retry_after
+
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+def parse_retry_after(value):
+    """
+    Parses the Retry-After header (seconds or HTTP date) and returns
+    the seconds to wait, None if the header is missing or invalid
+    """
+    if value is None:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0, when.timestamp() - time.time())
+
+
+def parse_content_type(value):
+    """
+    Returns a tuple (mime type, charset) of a Content-Type header,
+    the charset defaults to utf-8
+    """
+    if value is None:
+        return (None, 'utf-8')
+
+    parts = value.split(';')
+    charset = 'utf-8'
+
+    for part in parts[1:]:
+        key, _, val = part.partition('=')
+        if key.strip().lower() == 'charset' and val.strip():
+            charset = val.strip().strip('"')
+
+    return (parts[0].strip().lower(), charset)
+
+
+def decompressor(encoding, first):
+    """
+    Returns a zlib decompression object for the Content-Encoding, None
+    for uncompressed responses. first is the first chunk of the body,
+    it tells whether a deflate response is zlib wrapped (as it should
+    be) or raw.
+    """
+    if encoding in (None, '', 'identity'):
+        return None
+
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    if encoding == 'deflate':
+        if len(first) >= 2 and first[0] & 0x0f == 8 and (first[0] << 8 | first[1]) % 31 == 0:
+            return zlib.decompressobj(zlib.MAX_WBITS)
+        return zlib.decompressobj(-zlib.MAX_WBITS)
+
+    raise WeclappError('Unsupported Content-Encoding: %s' % encoding)
+
+
+def iter_content(resp, chunk_size=CHUNK_SIZE):
+    """
+    Reads the body of the response chunk by chunk and yields the
+    decompressed chunks (gzip and deflate are supported)
+    """
+    encoding = resp.headers.get('Content-Encoding', None)
+    if encoding is not None:
+        encoding = encoding.strip().lower()
+
+    decomp = None
+
+    try:
+        while True:
+            chunk = resp.read(chunk_size)
+            if not chunk:
+                break
+
+            if decomp is None:
+                decomp = decompressor(encoding, chunk) or False
+
+            if not decomp:
+                yield chunk
+                continue
+
+            # the decompressed chunks are not larger than chunk_size either
+            while chunk:
+                data = decomp.decompress(chunk, chunk_size)
+                chunk = decomp.unconsumed_tail
+                if data:
+                    yield data
+
+        if decomp:
+            tail = decomp.flush()
+            if tail:
+                yield tail
+    except (http.client.HTTPException, OSError, zlib.error) as e:
+        raise WeclappError('Unable to read response from call: %s' % str(e))
+
+
+class ResultDecoder(object):
+    """
+    Incrementally decodes a JSON object like {"result": [ {...}, {...} ]}.
+
+    feed() takes the next part of the text and returns the items of
+    the result array which are complete so far, the other fields of
+    the object are stored in fields.
+    """
+
+    def __init__(self, key='result'):
+        self.key = key
+        self.fields = {}
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.state = 'start'
+        self.current = None
+
+    def skip(self, chars):
+        """
+        Skips the characters in chars, returns False when the end of
+        the buffer is reached
+        """
+        buf, pos = self.buf, self.pos
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+        self.pos = pos
+        return pos < len(buf)
+
+    def value(self, final):
+        """
+        Decodes the next value, returns a tuple (complete, value)
+        """
+        try:
+            value, end = self.decoder.raw_decode(self.buf, self.pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return (False, None)
+
+        # a number is only complete when something else follows it, the
+        # next part might continue it (2 -> 2.5, 1 -> 1e3)
+        if not final and self.buf[self.pos] in NUMBER_START:
+            if end == len(self.buf) or self.buf[end] in NUMBER_CHARS:
+                return (False, None)
+
+        self.pos = end
+        return (True, value)
+
+    def feed(self, text, final=False):
+        if self.pos > 0:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += text
+
+        items = []
+        ws = ' \t\n\r'
+
+        while self.skip(ws):
+            ch = self.buf[self.pos]
+
+            if self.state == 'start':
+                if ch != '{':
+                    raise json.JSONDecodeError('Expecting \'{\'', self.buf, self.pos)
+                self.pos += 1
+                self.state = 'key'
+
+            elif self.state == 'key':
+                if ch in ',':
+                    self.pos += 1
+                    continue
+                if ch == '}':
+                    self.pos += 1
+                    self.state = 'done'
+                    continue
+
+                complete, key = self.value(final)
+                if not complete:
+                    break
+                self.current = key
+                self.state = 'colon'
 
+            elif self.state == 'colon':
+                if ch != ':':
+                    raise json.JSONDecodeError('Expecting \':\' delimiter', self.buf, self.pos)
+                self.pos += 1
+                self.state = 'value'
+
+            elif self.state == 'value':
+                if self.current == self.key and ch == '[':
+                    self.pos += 1
+                    self.state = 'items'
+                    continue
+
+                complete, value = self.value(final)
+                if not complete:
+                    break
+                self.fields[self.current] = value
+                self.state = 'key'
+
+            elif self.state == 'items':
+                if ch == ',':
+                    self.pos += 1
+                    continue
+                if ch == ']':
+                    self.pos += 1
+                    self.state = 'key'
+                    continue
+
+                complete, value = self.value(final)
+                if not complete:
+                    break
+                items.append(value)
+
+            else:
+                raise json.JSONDecodeError('Extra data', self.buf, self.pos)
+
+        if final and self.state != 'done':
+            raise json.JSONDecodeError('Unexpected end of data', self.buf, self.pos)
+
+        return items
+
+
+def decode_response(headers, status, data):
+    """
+    Decodes the body of a response according to its Content-Type,
+    JSON responses are returned as Python objects, other responses
+    as bytes
+    """
+    content_type, charset = parse_content_type(headers.get('Content-Type', None))
+
+    if content_type == 'application/json':
+        try:
+            data = json.loads(data.decode(charset))
+        except Exception as e:
+            raise WeclappError('Unable to get JSON response: %s' % str(e), status=status)
+
+    return data
+
+
+class RateLimiter(object):
+    """
+    A thread safe token bucket. Every API call takes a token, the bucket
+    is refilled with rate tokens per second and holds at most burst tokens.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Takes a token if one is available and returns None, otherwise
+        returns the seconds to wait for the next token
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Blocks until a token is available
+        """
+        while True:
+            wait = self.take()
+            if wait is None:
+                return
+
+            time.sleep(wait)
+
+
+class BaseWeclappAPI(object):
+    """
+    The parts shared by WeclappAPI and weclapp.asyncapi.AsyncWeclappAPI:
+    the configuration, the retry policy, the rate limiter, the
+    connection pools and building the requests
+    """
+
+    pool_class = ConnectionPool
+    limiter_class = RateLimiter
 
-class WeclappAPI(object):
     def __init__(self, config):
         """
         config is a dictionary with the following keys:
@@ -21,8 +479,22 @@ class WeclappAPI(object):
          - path
          - apitoken
          - ssl
+         - poolsize (optional)
+         - retry_attempts (optional)
+         - retry_backoff (optional, in milliseconds)
+         - rate_limit (optional, requests per second, 0 disables it)
         """
         self.config = config
+        self.pools = {}
+        self._pools_lock = threading.Lock()
+
+        self.retry = RetryPolicy(max_attempts=Config.optional_value(config, 'retry_attempts'),
+                backoff=Config.optional_value(config, 'retry_backoff') / 1000)
+
+        self.limiter = None
+        rate_limit = Config.optional_value(config, 'rate_limit')
+        if rate_limit > 0:
+            self.limiter = self.limiter_class(rate_limit)
 
     def urljoin(self, *args):
         """
@@ -38,21 +510,41 @@ class WeclappAPI(object):
 
         return '/'.join(n)
 
-    def call(self, command, method, query = {}, body = None, expected_status_code = 200):
+    def get_pool(self):
         """
-        Make an API call
+        Returns the connection pool for the configured domain
         """
+        key = (self.config['domain'], bool(self.config['ssl']))
 
-        params = urllib.parse.urlencode(query)
+        with self._pools_lock:
+            pool = self.pools.get(key, None)
+            if pool is None:
+                maxsize = Config.optional_value(self.config, 'poolsize')
+                pool = self.pool_class(key[0], maxsize, ssl=key[1])
+                self.pools[key] = pool
 
-        if self.config['ssl']:
-            klass = http.client.HTTPSConnection
-        else:
-            klass = http.client.HTTPConnection
+        return pool
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+        with self._pools_lock:
+            pools = list(self.pools.values())
+
+        for pool in pools:
+            pool.close()
+
+    def prepare(self, command, method, query = {}):
+        """
+        Returns a tuple (url, headers) for the API call
+        """
+        params = urllib.parse.urlencode(query)
 
         url = self.urljoin(self.config['path'], command)
         headers = {
             "AuthenticationToken": self.config['apitoken'],
+            "Accept-Encoding": "gzip, deflate",
         }
 
         if params != '':
@@ -61,48 +553,171 @@ class WeclappAPI(object):
         if method in [ 'POST', 'PUT' ]:
             headers['Content-Type'] = 'application/json'
 
-        log.debug('HTTP %s %s', method, url)
-        conn = klass(self.config['domain'])
-        try:
-            conn.request(method, url, headers=headers, body=body)
-            resp = conn.getresponse()
-        except Exception as e:
-            raise WeclappError('Unable to make the API call: %s' % str(e))
+        return (url, headers)
+
 
-        log.debug('HTTP call returned: %s', resp.status)
+class WeclappAPI(BaseWeclappAPI):
+    """
+    The client of the weclapp public API. It is thread safe, the calls
+    share a pool of keep-alive connections.
+    """
+
+    def send(self, method, url, headers, body=None):
+        """
+        Sends the request over a pooled connection.
+
+        When a reused connection has been closed by the server before
+        the request was sent, the request is sent once more over a fresh
+        connection. If it was closed while waiting for the response, the
+        request might have been processed, so only idempotent requests
+        are sent again.
+
+        returns a tuple (pool, connection, response), the response must
+        be read with read() or iter_content() and the connection must be
+        released to the pool afterwards
+        """
+        pool = self.get_pool()
+
+        while True:
+            conn, reused = pool.acquire()
+            try:
+                conn.request(method, url, headers=headers, body=body)
+            except ConnectionError as e:
+                pool.release(conn, reuse=False)
+                if reused:
+                    log.debug('Keep-alive connection was closed by the server, reconnecting')
+                    continue
+                raise WeclappError('Unable to make the API call: %s' % str(e))
+            except Exception as e:
+                pool.release(conn, reuse=False)
+                raise WeclappError('Unable to make the API call: %s' % str(e))
 
-        data = None
-        if resp.status != expected_status_code:
             try:
-                data = resp.read()
-            except:
-                pass
+                resp = conn.getresponse()
+            except ConnectionError as e:
+                pool.release(conn, reuse=False)
+                if reused and method in self.retry.idempotent_methods:
+                    log.debug('Keep-alive connection was closed by the server, reconnecting')
+                    continue
+                raise WeclappError('Unable to make the API call: %s' % str(e))
+            except Exception as e:
+                pool.release(conn, reuse=False)
+                raise WeclappError('Unable to make the API call: %s' % str(e))
 
-            raise WeclappError('Unable to make the API call: HTTP CODE %s :: %s' % (resp.code, data))
+            return (pool, conn, resp)
 
+    def read(self, pool, conn, resp):
+        """
+        Reads the whole (decompressed) body of the response and releases
+        the connection
+        """
         try:
-            data = resp.read()
-        except Exception as e:
-            raise WeclappError('Unable to read response from call: %s' % str(e))
+            data = b''.join(iter_content(resp))
+        except:
+            pool.release(conn, reuse=False)
+            raise
 
-        conn.close()
+        pool.release(conn, reuse=not resp.will_close)
 
-        content_type = resp.headers.get('Content-Type', None)
+        return data
 
-        if content_type is None:
-            return data
+    def request(self, method, url, headers, body=None):
+        """
+        Sends the request over a pooled connection and reads the
+        whole response.
 
-        cts = content_type.split(';')
-        if cts[0] == 'application/json':
-            kwargs = {}
-            if len(cts) > 1 and cts[1].startswith('charset'):
-                enc = cts[1].split("=")
-                if len(enc) > 1:
-                    kwargs['encoding'] = enc[1]
+        returns a tuple (response, body)
+        """
+        pool, conn, resp = self.send(method, url, headers, body=body)
+        return (resp, self.read(pool, conn, resp))
+
+    def open(self, command, method, query = {}, body = None, expected_status_code = 200):
+        """
+        Sends the API call, retrying it according to the retry policy,
+        until a response with the expected status code is received.
+
+        returns a tuple (pool, connection, response) like send()
+        """
+
+        url, headers = self.prepare(command, method, query)
 
+        attempt = 0
+        while True:
+            attempt += 1
+
+            if self.limiter is not None:
+                self.limiter.acquire()
+
+            log.debug('HTTP %s %s', method, url)
             try:
-                data = json.loads(data, **kwargs)
-            except Exception as e:
-                raise WeclappError('Unable to get JSON response: %s' % str(e))
+                pool, conn, resp = self.send(method, url, headers, body=body)
+            except WeclappError as e:
+                if not self.retry.should_retry(attempt, method):
+                    raise
 
-        return data
+                delay = self.retry.delay(attempt)
+                log.debug('%s, retrying in %.2f seconds', str(e), delay)
+                time.sleep(delay)
+                continue
+
+            log.debug('HTTP call returned: %s', resp.status)
+
+            if resp.status == expected_status_code:
+                return (pool, conn, resp)
+
+            try:
+                data = self.read(pool, conn, resp)
+            except WeclappError:
+                data = b''
+
+            if not self.retry.should_retry(attempt, method, resp.status):
+                raise WeclappError('Unable to make the API call: HTTP CODE %s :: %s' % (resp.status, data),
+                        status=resp.status)
+
+            delay = self.retry.delay(attempt, parse_retry_after(resp.headers.get('Retry-After', None)))
+            log.debug('HTTP CODE %s, retrying in %.2f seconds', resp.status, delay)
+            time.sleep(delay)
+
+    def call(self, command, method, query = {}, body = None, expected_status_code = 200):
+        """
+        Make an API call
+        """
+        pool, conn, resp = self.open(command, method, query=query, body=body,
+                expected_status_code=expected_status_code)
+
+        data = self.read(pool, conn, resp)
+
+        return decode_response(resp.headers, resp.status, data)
+
+    def stream(self, command, method = 'GET', query = {}, expected_status_code = 200):
+        """
+        Make an API call and yield the items of the result array of
+        the JSON response while the response is received, without
+        holding the whole response in memory
+        """
+        pool, conn, resp = self.open(command, method, query=query,
+                expected_status_code=expected_status_code)
+
+        completed = False
+
+        try:
+            content_type, charset = parse_content_type(resp.headers.get('Content-Type', None))
+            if content_type != 'application/json':
+                raise WeclappError('Unable to get JSON response: Content-Type is %s' % content_type,
+                        status=resp.status)
+
+            try:
+                text = codecs.getincrementaldecoder(charset)()
+                decoder = ResultDecoder()
+
+                for chunk in iter_content(resp):
+                    yield from decoder.feed(text.decode(chunk))
+
+                yield from decoder.feed(text.decode(b'', final=True), final=True)
+            except (LookupError, ValueError) as e:
+                raise WeclappError('Unable to get JSON response: %s' % str(e), status=resp.status)
+
+            completed = True
+        finally:
+            # a partially read response leaves the connection unusable
+            pool.release(conn, reuse=completed and not resp.will_close)
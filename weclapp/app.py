@@ -1,22 +1,28 @@
+import os
 import sys
-import coloredlogs, logging
+import logging
+import importlib
 
 from argparse import ArgumentParser
 
 from .config.config import def_config, Config
-from .modules import ConfigModule, ProjectModule, UploadModule
-from .api import WeclappAPI
 from . import ConfigInvalid, WeclappBaseException
-from .models.base import WeclappBaseModel
 from .exception import PrintHelp
 from .version import VERSION
 
+# the commands: (command, module, class). A module is only imported
+# when its command is run (or the help of all commands is printed)
 modules = [
-    ConfigModule,
-    ProjectModule,
-    UploadModule,
+    ('config', '.modules.config', 'ConfigModule'),
+    ('projects', '.modules.project', 'ProjectModule'),
+    ('upload', '.modules.upload', 'UploadModule'),
+    ('report', '.modules.report', 'ReportModule'),
+    ('serve', '.modules.serve', 'ServeModule'),
 ]
 
+# the commands that are run by the daemon (weclapp-cli serve) if it is running
+served_commands = [ 'projects', 'report', 'upload' ]
+
 
 log = logging.getLogger("weclapp-cli")
 
@@ -26,7 +32,31 @@ class WeclappApp(object):
     """
 
     def __init__(self, args = sys.argv):
-        parser = ArgumentParser(prog=args[0], description='Weclapp command line interface')
+        self.args = args
+        self.command_index = find_command(args[1:])
+        self.command = None
+        if self.command_index is not None:
+            self.command = args[1 + self.command_index]
+        self._parser = None
+
+    @property
+    def parser(self):
+        """
+        The argument parser, created on first access
+        """
+        if self._parser is None:
+            self._parser = self.create_parser()
+
+        return self._parser
+
+    def create_parser(self, with_commands=True):
+        """
+        Creates the argument parser. If the command is known, only its
+        module is imported, the other commands are added without options.
+        """
+        args = self.args
+        parser = ArgumentParser(prog=args[0], description='Weclapp command line interface',
+                add_help=with_commands)
 
         parser.add_argument('-c', '--config', action='store', default=def_config, metavar='FILE',
                 help='Sets the path of configuration file. Default %s' % def_config)
@@ -37,20 +67,75 @@ class WeclappApp(object):
         parser.add_argument('-v', '--version', action='store_true', default=False,
                 help='Print version')
 
+        if not with_commands:
+            return parser
+
         subparser = parser.add_subparsers(title="COMMANDS", description='weclapp-cli commands',
                 help='Pass -h after the command to get additional help for the command')
 
-        self.modules = []
+        known = [ command for command, module, klass in modules ]
 
-        for mod in modules:
+        for command, module, klass in modules:
+            if self.command in known and command != self.command:
+                subparser.add_parser(command)
+                continue
+
+            mod = getattr(importlib.import_module(module, __package__), klass)
             p = subparser.add_parser(mod.name, **mod.cmdline_opts)
             mod.init_argparser(p)
 
-        self.parser = parser
-        self.args = args
+        return parser
+
+
+    def forward(self):
+        """
+        Sends the command to the daemon if one is running for the
+        configuration. Returns the exit status, None if the command
+        has to be run by this process.
+        """
+        from .server import send_request, def_socket_path, DaemonFailed
+
+        global_args = self.args[1:1 + self.command_index]
+        namespace, rest = self.create_parser(with_commands=False).parse_known_args(global_args)
+        if namespace.debug or namespace.version or rest:
+            return None
+
+        config = os.path.abspath(namespace.config)
+        path = def_socket_path(config)
+        if not os.path.exists(path):
+            return None
+
+        args = self.args[1:]
+        if not sys.stdout.isatty():
+            # like colorama, no colors if the output is redirected
+            args = args + [ '--no-color' ]
 
+        response = send_request(path, { 'args': args, 'config': config, 'cwd': os.getcwd() })
+        if response is None:
+            return None
+
+        if 'refused' in response:
+            log.debug('The daemon refused the command: %s', response['refused'])
+            return None
+
+        if 'error' in response:
+            raise DaemonFailed(response['error'])
+
+        return response['status']
 
     def run(self):
+        if self.command in served_commands:
+            status = self.forward()
+            if status is not None:
+                return status
+
+        if self.command is None:
+            # weclapp-cli -v doesn't need the commands
+            namespace, rest = self.create_parser(with_commands=False).parse_known_args(self.args[1:])
+            if namespace.version and not rest:
+                print(VERSION)
+                return 1
+
         namespace = self.parser.parse_args(self.args[1:])
         if namespace.version:
             print(VERSION)
@@ -62,6 +147,7 @@ class WeclappApp(object):
             return 1
 
         if namespace.debug:
+            import coloredlogs
             coloredlogs.install(level='DEBUG')
             logging.basicConfig(level=logging.DEBUG)
 
@@ -75,6 +161,8 @@ class WeclappApp(object):
                 raise ConfigInvalid('Invalid configuration. Please execute \'weclapp-cli config\' to create a new configuration')
 
         if namespace.module.autoload_api:
+            from .api import WeclappAPI
+            from .models.base import WeclappBaseModel
             WeclappBaseModel.__api__ = WeclappAPI(cfg.config)
 
         try:
@@ -83,3 +171,22 @@ class WeclappApp(object):
             print('%s\n----------------------------' % str(e), file=sys.stderr)
             self.parser.print_help(file=sys.stderr)
             return 1
+
+
+def find_command(args):
+    """
+    Returns the index of the command in the command line arguments
+    (without the program name), None if there is none. The global
+    options before the command are skipped.
+    """
+    skip = False
+
+    for i, arg in enumerate(args):
+        if skip:
+            skip = False
+        elif arg in ('-c', '--config'):
+            skip = True
+        elif not arg.startswith('-'):
+            return i
+
+    return None
@@ -0,0 +1,478 @@
+import http.client
+import urllib.parse
+import asyncio
+import ssl
+import logging
+
+from .api import BaseWeclappAPI, WeclappError, RateLimiter, parse_retry_after, \
+        decode_response, decompressor
+
+log = logging.getLogger("weclapp-cli")
+
+class AsyncResponse(object):
+    """
+    A HTTP response read by AsyncConnection. headers is a
+    http.client.HTTPMessage, data the (decompressed) body
+    """
+
+    def __init__(self, status, headers, data, will_close):
+        self.status = status
+        self.headers = headers
+        self.data = data
+        self.will_close = will_close
+
+
+class AsyncConnection(object):
+    """
+    A HTTP/1.1 keep-alive connection using asyncio streams. The
+    connection is opened by the first request.
+    """
+
+    def __init__(self, domain, ssl=True):
+        url = urllib.parse.urlsplit('//' + domain)
+
+        self.domain = domain
+        self.host = url.hostname
+        self.port = url.port or (443 if ssl else 80)
+        self.ssl = ssl
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.ssl else None
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    def encode(self, method, url, headers, body=None):
+        """
+        Returns the bytes of the request
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        lines = [ '%s %s HTTP/1.1' % (method, url), 'Host: %s' % self.domain ]
+        lines += [ '%s: %s' % (key, value) for key, value in headers.items() ]
+
+        if body is not None or method in [ 'POST', 'PUT' ]:
+            lines.append('Content-Length: %d' % len(body or b''))
+
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b'')
+
+    def dropped(self):
+        """
+        Returns True if the server closed the idle connection
+        """
+        if self.writer is None:
+            return False
+
+        return self.reader.at_eof() or self.writer.transport.is_closing()
+
+    async def send(self, method, url, headers, body=None):
+        """
+        Sends the request, the response is read with read_response()
+        """
+        if self.writer is None:
+            await self.connect()
+
+        self.writer.write(self.encode(method, url, headers, body))
+        await self.writer.drain()
+
+    async def request(self, method, url, headers, body=None):
+        """
+        Sends the request and reads the whole response, returns
+        an AsyncResponse
+        """
+        await self.send(method, url, headers, body)
+
+        return await self.read_response(method)
+
+    async def pipeline(self, requests):
+        """
+        Sends the requests, a list of (method, url, headers, body) tuples,
+        without waiting for the responses (HTTP/1.1 pipelining) and reads
+        the responses in order while the requests are sent.
+
+        Returns a tuple (responses, error). responses is the list of
+        AsyncResponse objects read, it is shorter than requests if the
+        server closed the connection or a response could not be read.
+        error is the exception that stopped reading the responses, None
+        if all were read or the server announced to close the connection
+        (Connection: close).
+
+        Raises OSError if the requests were not sent: connecting failed
+        or the idle connection was closed by the server.
+        """
+        if self.writer is None:
+            await self.connect()
+        elif self.dropped():
+            raise ConnectionResetError('The server closed the connection')
+
+        writer = self.writer
+
+        async def send():
+            writer.write(b''.join(self.encode(*request) for request in requests))
+            await writer.drain()
+
+        # the responses are read while the requests are sent, otherwise
+        # both sides could block on full socket buffers
+        sender = asyncio.ensure_future(send())
+        responses = []
+        error = None
+
+        try:
+            for method, url, headers, body in requests:
+                try:
+                    resp = await self.read_response(method)
+                except Exception as e:
+                    # the responses read so far are valid
+                    log.debug('Failed to read the response %d of %d pipelined requests: %s',
+                            len(responses) + 1, len(requests), str(e))
+                    error = e
+                    break
+
+                responses.append(resp)
+                if resp.will_close:
+                    break
+        finally:
+            if not sender.done():
+                sender.cancel()
+
+            try:
+                await sender
+            except (asyncio.CancelledError, ConnectionError):
+                pass
+
+        return (responses, error)
+
+    async def read_response(self, method):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionResetError('The server closed the connection')
+
+        version, status, _ = (line.decode('latin-1').rstrip('\r\n') + '  ').split(' ', 2)
+        if not version.startswith('HTTP/') or not status.isdigit():
+            raise http.client.BadStatusLine(line)
+        status = int(status)
+
+        headers = http.client.HTTPMessage()
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip()] = value.strip()
+
+        will_close = version == 'HTTP/1.0' or headers.get('Connection', '').lower() == 'close'
+
+        if method == 'HEAD' or status < 200 or status in (204, 304):
+            data = b''
+        elif headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            data = await self.read_chunked()
+        elif headers.get('Content-Length', None) is not None:
+            data = await self.reader.readexactly(int(headers['Content-Length']))
+        else:
+            data = await self.reader.read()
+            will_close = True
+
+        data = self.decompress(headers.get('Content-Encoding', None), data)
+
+        return AsyncResponse(status, headers, data, will_close)
+
+    async def read_chunked(self):
+        chunks = []
+
+        while True:
+            line = await self.reader.readline()
+            size = int(line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                break
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+        # trailers
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+        return b''.join(chunks)
+
+    @staticmethod
+    def decompress(encoding, data):
+        if encoding is not None:
+            encoding = encoding.strip().lower()
+
+        decomp = decompressor(encoding, data)
+        if decomp is None:
+            return data
+
+        return decomp.decompress(data) + decomp.flush()
+
+
+class AsyncConnectionPool(object):
+    """
+    A pool of AsyncConnection objects for a (domain, ssl) pair.
+
+    At most maxsize connections are handed out at the same time,
+    further callers wait until a connection is released.
+    """
+
+    def __init__(self, domain, maxsize, ssl=True):
+        self.domain = domain
+        self.ssl = ssl
+        self.maxsize = max(1, maxsize)
+
+        self._idle = []
+        self._slots = asyncio.Semaphore(self.maxsize)
+
+    async def acquire(self):
+        """
+        Returns a tuple (conn, reused) like ConnectionPool.acquire()
+        """
+        await self._slots.acquire()
+
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.dropped():
+                return (conn, True)
+
+            log.debug('Keep-alive connection was closed by the server')
+            conn.close()
+
+        return (AsyncConnection(self.domain, ssl=self.ssl), False)
+
+    def release(self, conn, reuse=True):
+        if reuse:
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+        self._slots.release()
+
+    def close(self):
+        idle, self._idle = self._idle, []
+
+        for conn in idle:
+            conn.close()
+
+
+class AsyncRateLimiter(RateLimiter):
+    """
+    A RateLimiter for coroutines, acquire() waits without blocking
+    the event loop
+    """
+
+    async def acquire(self):
+        while True:
+            wait = self.take()
+            if wait is None:
+                return
+
+            await asyncio.sleep(wait)
+
+
+class AsyncWeclappAPI(BaseWeclappAPI):
+    """
+    An asyncio version of weclapp.api.WeclappAPI. call() is a
+    coroutine with the same semantics as WeclappAPI.call(), it
+    raises weclapp.api.WeclappError on failure.
+
+    The calls share a pool of keep-alive connections, at most
+    poolsize calls are sent at the same time. Use a large poolsize
+    (for example 100) to run many calls at once on one thread.
+
+    The connection pools are created on first use, so the object can
+    be created outside of the event loop, but it must only be used by
+    one event loop.
+    """
+
+    pool_class = AsyncConnectionPool
+    limiter_class = AsyncRateLimiter
+
+    async def request(self, method, url, headers, body=None):
+        """
+        Sends the request over a pooled connection, returns an
+        AsyncResponse.
+
+        Like WeclappAPI.send(), when a reused connection has been closed
+        by the server, the request is sent once more over a fresh
+        connection if it could not be sent or if it is idempotent.
+        """
+        pool = self.get_pool()
+
+        while True:
+            conn, reused = await pool.acquire()
+            sent = False
+            try:
+                await conn.send(method, url, headers, body=body)
+                sent = True
+                resp = await conn.read_response(method)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                pool.release(conn, reuse=False)
+                if reused and (not sent or method in self.retry.idempotent_methods):
+                    log.debug('Keep-alive connection was closed by the server, reconnecting')
+                    continue
+                raise WeclappError('Unable to make the API call: %s' % str(e))
+            except Exception as e:
+                pool.release(conn, reuse=False)
+                raise WeclappError('Unable to make the API call: %s' % str(e))
+            except BaseException:
+                # cancelled, the response might be read only partially
+                pool.release(conn, reuse=False)
+                raise
+
+            pool.release(conn, reuse=not resp.will_close)
+
+            return resp
+
+    async def call_batch(self, command, method, bodies, query = {}, expected_status_code = 200):
+        """
+        Makes one API call per body. The calls are pipelined over one
+        connection, so a batch costs about one round trip instead of
+        one per call.
+
+        Returns a list with the decoded result or the WeclappError of
+        every body, in the order of bodies.
+
+        The answered calls are retried like call() does: rejected calls
+        (429, 503) are sent again. Calls are only sent again without an
+        answer when they were not processed by the server: the requests
+        could not be sent at all, or the server announced to close the
+        connection before answering them. The other calls without an
+        answer might have been processed, they are only sent again if
+        the method is idempotent.
+        """
+        url, headers = self.prepare(command, method, query)
+        pool = self.get_pool()
+
+        results = [ None ] * len(bodies)
+        attempts = [ 0 ] * len(bodies)
+        pending = list(range(len(bodies)))
+
+        while pending:
+            if self.limiter is not None:
+                for _ in pending:
+                    await self.limiter.acquire()
+
+            log.debug('HTTP %s %s, %d pipelined calls', method, url, len(pending))
+
+            requests = [ (method, url, headers, bodies[i]) for i in pending ]
+
+            retry = []
+            delay = 0
+
+            conn, reused = await pool.acquire()
+            try:
+                responses, error = await conn.pipeline(requests)
+            except OSError as e:
+                pool.release(conn, reuse=False)
+
+                if reused:
+                    log.debug('Keep-alive connection was closed by the server, reconnecting')
+                    continue
+
+                # connecting failed, nothing was sent
+                for i in pending:
+                    attempts[i] += 1
+                    if attempts[i] < self.retry.max_attempts:
+                        retry.append(i)
+                        delay = max(delay, self.retry.delay(attempts[i]))
+                    else:
+                        results[i] = WeclappError('Unable to make the API call: %s' % str(e))
+
+                if retry and delay > 0:
+                    log.debug('Retrying %d calls in %.2f seconds', len(retry), delay)
+                    await asyncio.sleep(delay)
+
+                pending = retry
+                continue
+            except BaseException:
+                # cancelled, the responses might be read only partially
+                pool.release(conn, reuse=False)
+                raise
+
+            closed = len(responses) > 0 and responses[-1].will_close
+            pool.release(conn, reuse=error is None and not closed and len(responses) == len(requests))
+
+            for i, resp in zip(pending, responses):
+                attempts[i] += 1
+
+                if resp.status == expected_status_code:
+                    try:
+                        results[i] = decode_response(resp.headers, resp.status, resp.data)
+                    except WeclappError as e:
+                        results[i] = e
+                elif self.retry.should_retry(attempts[i], method, resp.status):
+                    retry.append(i)
+                    delay = max(delay, self.retry.delay(attempts[i],
+                        parse_retry_after(resp.headers.get('Retry-After', None))))
+                else:
+                    results[i] = WeclappError('Unable to make the API call: HTTP CODE %s :: %s' % (resp.status, resp.data),
+                            status=resp.status)
+
+            for i in pending[len(responses):]:
+                if error is None and closed:
+                    # not processed, the server closed the connection before
+                    retry.append(i)
+                    continue
+
+                attempts[i] += 1
+                if self.retry.should_retry(attempts[i], method):
+                    retry.append(i)
+                    delay = max(delay, self.retry.delay(attempts[i]))
+                else:
+                    reason = error or 'the server closed the connection'
+                    results[i] = WeclappError('Unable to make the API call: no response, the call might have '
+                            'been processed: %s' % reason)
+
+            if retry and delay > 0:
+                log.debug('Retrying %d calls in %.2f seconds', len(retry), delay)
+                await asyncio.sleep(delay)
+
+            pending = sorted(retry)
+
+        return results
+
+    async def call(self, command, method, query = {}, body = None, expected_status_code = 200):
+        """
+        Make an API call
+        """
+        url, headers = self.prepare(command, method, query)
+
+        attempt = 0
+        while True:
+            attempt += 1
+
+            if self.limiter is not None:
+                await self.limiter.acquire()
+
+            log.debug('HTTP %s %s', method, url)
+            try:
+                resp = await self.request(method, url, headers, body=body)
+            except WeclappError as e:
+                if not self.retry.should_retry(attempt, method):
+                    raise
+
+                delay = self.retry.delay(attempt)
+                log.debug('%s, retrying in %.2f seconds', str(e), delay)
+                await asyncio.sleep(delay)
+                continue
+
+            log.debug('HTTP call returned: %s', resp.status)
+
+            if resp.status == expected_status_code:
+                break
+
+            if not self.retry.should_retry(attempt, method, resp.status):
+                raise WeclappError('Unable to make the API call: HTTP CODE %s :: %s' % (resp.status, resp.data),
+                        status=resp.status)
+
+            delay = self.retry.delay(attempt, parse_retry_after(resp.headers.get('Retry-After', None)))
+            log.debug('HTTP CODE %s, retrying in %.2f seconds', resp.status, delay)
+            await asyncio.sleep(delay)
+
+        return decode_response(resp.headers, resp.status, resp.data)
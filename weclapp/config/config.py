@@ -1,5 +1,4 @@
 import os
-import yaml
 
 from .exceptions import *
 
@@ -18,6 +17,18 @@ class Config(object):
         ('ssl', 'Use SSL', "yes", bool)
     )
 
+    # (key, help, default, type)
+    # these values are not asked interactively, the default is
+    # used when the key is missing in the configuration file
+    optional_config_values = (
+        ('poolsize', 'Number of keep-alive connections to the API', 4, int),
+        ('reconcile_interval', 'Hours between two full reconciliations of the local store', 24, int),
+        ('cache_ttl', 'Seconds until the cached projects and tasks are checked again', 600, int),
+        ('retry_attempts', 'Maximal number of attempts of a failed API call', 3, int),
+        ('retry_backoff', 'Milliseconds to wait before the first retry, doubled on every retry', 500, int),
+        ('rate_limit', 'Maximal number of API calls per second, 0 means no limit', 0, int),
+    )
+
     def __init__(self, path=def_config):
         self.path = path
         self.config = None
@@ -38,6 +49,10 @@ class Config(object):
             if not isinstance(val, klass):
                 return False
 
+        for key, _, _, klass in self.optional_config_values:
+            if key in self.config and not isinstance(self.config[key], klass):
+                return False
+
         return True
 
     def parse(self):
@@ -48,6 +63,8 @@ class Config(object):
         if not os.path.exists(self.path):
             raise ConfigNotFound("Config file cannot be found", path=self.path)
 
+        import yaml
+
         try:
             fp = open(self.path, "r")
             self.config = yaml.load(fp, Loader=yaml.SafeLoader)
@@ -57,7 +74,18 @@ class Config(object):
         if not self.validate():
             raise ConfigInvalid('The parsed configuration is invalid')
 
+    @classmethod
+    def optional_value(cls, config, key):
+        """
+        Returns the optional value key of the config dictionary or its
+        default when the key is missing. The defaults are not stored in
+        the config, so they are not written into the configuration file.
+        """
+        for name, _, default, _ in cls.optional_config_values:
+            if name == key:
+                return config.get(key, default)
 
+        raise KeyError(key)
 
     def interactive_config(self, verbose=True, **kwargs):
         """
@@ -72,8 +100,10 @@ class Config(object):
 
             from weclapp import Config
             print(Config.config_values)
+            print(Config.optional_config_values)
 
-        from the python console
+        from the python console. Optional values are never asked, they
+        are copied into the new config when passed.
 
         On success returns the a new config
         """
@@ -119,6 +149,11 @@ class Config(object):
 
             config[key] = newval
 
+        for key, _, _, _ in self.optional_config_values:
+            val = kwargs.get(key, None)
+            if val is not None:
+                config[key] = val
+
         return config
 
     def set_new_config(self, config):
@@ -128,6 +163,8 @@ class Config(object):
         if self.config is None:
             raise ConfigCannotWrite("No config has been created")
 
+        import yaml
+
         cfg_dir = os.path.dirname(self.path)
 
         try:
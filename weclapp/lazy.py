@@ -0,0 +1,35 @@
+"""
+The CLI is started from shell loops and cron jobs, so its start time
+matters. The packages export their classes through lazy_attributes(),
+and heavy dependencies (yaml, dateutil, coloredlogs, asyncio) and the
+stores are imported inside the functions that use them. A command only
+imports what it needs.
+"""
+
+import sys
+import importlib
+
+def lazy_attributes(package, attributes):
+    """
+    Returns a module __getattr__ function (PEP 562) that imports the
+    attributes of a package from their modules on first access, so
+    importing the package doesn't import all its dependencies.
+
+    params:
+
+        package     the name of the package (__name__)
+        attributes  a dictionary attribute name -> module name relative
+                    to the package
+    """
+
+    def __getattr__(name):
+        module = attributes.get(name, None)
+        if module is None:
+            raise AttributeError('module \'%s\' has no attribute \'%s\'' % (package, name))
+
+        value = getattr(importlib.import_module(module, package), name)
+        setattr(sys.modules[package], name, value)
+
+        return value
+
+    return __getattr__
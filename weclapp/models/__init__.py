@@ -1,4 +1,13 @@
 from .exceptions import *
-from .project import WeclappProject
-from .task import WeclappTask
-from .timeRecord import WeclappTimeRecord
+from ..lazy import lazy_attributes
+
+_lazy = {
+    'WeclappProject': '.project',
+    'WeclappTask': '.task',
+    'WeclappTimeRecord': '.timeRecord',
+    'TimeRecordColumns': '.columns',
+    'Query': '.query',
+}
+
+__getattr__ = lazy_attributes(__name__, _lazy)
+__all__ = exceptions.__all__ + list(_lazy)
@@ -1,9 +1,100 @@
 import sys
+import json
 import math
 
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
 from .exceptions import *
+from .query import Query
+
+# number of values sent in one -in filter, the values are part of the
+# URL and long URLs are rejected by servers and proxies (HTTP 414)
+IN_FILTER_CHUNK_SIZE = 100
+
+class Timestamp(object):
+    """
+    A descriptor for fields that the public API returns as JavaScript
+    timestamps (milliseconds). The raw value is stored, the datetime
+    object is created on the first access.
+
+    Setting a datetime object is supported as well.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.raw = '_ms_%s' % name
+        self.cache = '_dt_%s' % name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+
+        dt = getattr(obj, self.cache, None)
+        if dt is None:
+            ms = getattr(obj, self.raw)
+            if ms is None:
+                return None
+            dt = datetime.fromtimestamp(int(ms) // 1000)
+            setattr(obj, self.cache, dt)
+
+        return dt
+
+    def __set__(self, obj, value):
+        if isinstance(value, datetime):
+            setattr(obj, self.raw, int(value.timestamp() * 1000))
+            setattr(obj, self.cache, value)
+            return
+
+        setattr(obj, self.raw, value)
+        setattr(obj, self.cache, None)
+
+
+class WeclappModelMeta(type):
+    """
+    Creates the __slots__ of the model classes out of __fields__,
+    __timestamps__ and __extra_slots__, unless the class defines
+    __slots__ itself. Models don't have a per-instance __dict__.
+
+    __properties__ is set to the field names of __fields__.
+    """
+
+    def __new__(mcls, name, bases, ns):
+        if '__fields__' in ns:
+            timestamps = ns.get('__timestamps__', [])
+            slots = []
+            setters = []
+
+            for field, klass, can_be_None in ns['__fields__']:
+                if field in timestamps:
+                    ns[field] = Timestamp(field)
+                    slots += [ ns[field].raw, ns[field].cache ]
+                    # __init__ stores the raw value, bypassing the descriptor
+                    setters.append((field, ns[field].raw, klass, can_be_None))
+                else:
+                    slots.append(field)
+                    setters.append((field, field, klass, can_be_None))
+
+            ns['__setters__'] = tuple(setters)
+            # the properties parameter that fetches only these fields
+            ns['__properties__'] = ','.join(field for field, klass, can_be_None in ns['__fields__'])
+        else:
+            slots = []
+
+        if '__slots__' not in ns:
+            inherited = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update(getattr(klass, '__slots__', ()))
+
+            slots += ns.get('__extra_slots__', [])
+
+            ns['__slots__'] = tuple(s for s in slots if s not in inherited)
+
+        return super().__new__(mcls, name, bases, ns)
 
-class WeclappBaseModel(object):
+
+class WeclappBaseModel(object, metaclass=WeclappModelMeta):
     __model__ = 'WeclappBaseModel'
     __fields__ = [
         # every model should fill this variable
@@ -11,26 +102,36 @@ class WeclappBaseModel(object):
         # (public api field, type, can_be_None)
     ]
 
+    # fields in __fields__ that are timestamps, they are
+    # converted to datetime objects on the first access
+    __timestamps__ = []
+
+    # further instance attributes of the model
+    __extra_slots__ = []
+
     __api__ = None
+    # a weclapp.asyncapi.AsyncWeclappAPI, used by the *_async methods
+    __async_api__ = None
     __fetch_command__ = None
     __expect_status_code__ = 200
     __method__ = 'GET'
 
     def __init__(self, **kwargs):
-        for field, klass, can_be_None in self.__fields__:
-            val = kwargs.get(field, None)
+        get = kwargs.get
+        for field, attr, klass, can_be_None in self.__setters__:
+            val = get(field, None)
             if val is None:
                 if can_be_None:
-                    setattr(self, field, None)
+                    setattr(self, attr, None)
                     continue
                 else:
                     raise ModelInvalidField('%s: The field \'%s\' cannot be found in public API response or is NULL' % (self.__model__, field))
 
-            if not isinstance(val, klass):
+            if type(val) is not klass and not isinstance(val, klass):
                 raise ModelInvalidField('%s: The field \'%s\' is not of type \'%s\'' % (self.__model__, field, klass.__name__))
 
 
-            setattr(self, field, val)
+            setattr(self, attr, val)
 
         self.setup(**kwargs)
 
@@ -43,6 +144,13 @@ class WeclappBaseModel(object):
         pass
 
 
+    def millis(self, field):
+        """
+        Returns the raw value (milliseconds) of a timestamp field
+        without creating a datetime object
+        """
+        return getattr(self, Timestamp(field).raw)
+
     def todict(self):
         ret = {}
 
@@ -59,7 +167,7 @@ class WeclappBaseModel(object):
 
 
     @classmethod
-    def load(cls, sort=None, pageSize=100, serializeNulls=True):
+    def load(cls, sort=None, pageSize=100, serializeNulls=False, concurrency=1, params=None, store=None):
         """
         Fetches the data from the public API
 
@@ -68,50 +176,262 @@ class WeclappBaseModel(object):
             sort           the sort parameters
             pageSize       number of elements
             serializeNulls serialize NULL entries
+            concurrency    number of pages fetched at the same time
+            params         additional query parameters, like filters
+            store          if set, the objects are loaded from this
+                           weclapp.SyncStore (or weclapp.store.ReferenceCache)
+                           instead of the public API
 
         See https://www.weclapp.com/api2/ for a better understanding
         of these parameters
 
-        If you pass pageSize=-1, then it will fetch all elements
+        If you pass pageSize=-1, then it will fetch all elements. The
+        pages are fetched by up to concurrency threads, the elements
+        are returned in page order. With one thread the objects are
+        created while the response is received.
+
+        Only the fields in __fields__ are fetched, unless params contains
+        a 'properties' entry. Missing fields are set to None, so
+        serializeNulls is not needed.
 
         pageSize is capped at 500
         """
-        if cls.__api__ is None:
-            raise ApiNotLoaded('The API is not loaded, cannot fetch the data')
+        if store is not None:
+            return store.load(cls, sort=sort, pageSize=pageSize, params=params)
 
-        if cls.__fetch_command__ is None:
-            raise WrongFetchCommand('This class (%s) has no valid fetch command' % cls.__name__)
+        params = dict(params or {})
+        if cls.__properties__:
+            params.setdefault('properties', cls.__properties__)
+
+        pages = cls._load_pages(sort=sort, pageSize=pageSize, serializeNulls=serializeNulls,
+                concurrency=concurrency, params=params)
+
+        return [ cls(**p) for page in pages for p in page ]
+
+    @classmethod
+    def load_in(cls, field, values, sort=None, pageSize=-1, concurrency=1, params=None, **kwargs):
+        """
+        Loads the objects whose field is one of values with the
+        '<field>-in' filter of the public API
+
+        params:
+
+            field        the field to filter
+            values       the accepted values
+            sort         the sort parameter
+            pageSize     number of objects, -1 loads all of them
+            concurrency  number of requests sent at the same time
+            params       additional query parameters, like filters
+            kwargs       further arguments of load()
+
+        The values are sent in chunks of IN_FILTER_CHUNK_SIZE so that the
+        URLs stay short, the results of the chunks are merged. With a
+        pageSize other than -1, the first pageSize objects of the merged
+        results (according to sort) are returned.
+        """
+        def sort_key(column):
+            if column in cls.__timestamps__:
+                return lambda obj: obj.millis(column)
+            return lambda obj: getattr(obj, column)
+
+        return cls._load_in(cls.load, sort_key, field, values, sort, pageSize, concurrency, params, kwargs)
+
+    @classmethod
+    def load_in_raw(cls, field, values, sort=None, pageSize=-1, concurrency=1, params=None, **kwargs):
+        """
+        Like load_in() but returns the entities as returned by the public
+        API (a list of dictionaries)
+        """
+        def sort_key(column):
+            return lambda row: row.get(column)
+
+        return cls._load_in(cls.load_raw, sort_key, field, values, sort, pageSize, concurrency, params, kwargs)
+
+    @classmethod
+    def _load_in(cls, loader, sort_key, field, values, sort, pageSize, concurrency, params, kwargs):
+        values = sorted(set(values))
+        chunks = [ values[i:i + IN_FILTER_CHUNK_SIZE] for i in range(0, len(values), IN_FILTER_CHUNK_SIZE) ]
+
+        def load(chunk, concurrency):
+            chunk_params = dict(params or {})
+            chunk_params['%s-in' % field] = json.dumps(chunk)
+            return loader(sort=sort, pageSize=pageSize, concurrency=concurrency, params=chunk_params, **kwargs)
+
+        if len(chunks) <= 1:
+            return load(values, concurrency) if len(values) > 0 else []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+            results = list(executor.map(lambda chunk: load(chunk, 1), chunks))
+
+        objects = [ obj for result in results for obj in result ]
+
+        if pageSize != -1:
+            if sort:
+                key = sort_key(sort.lstrip('-'))
+                objects.sort(key=lambda obj: (key(obj) is not None, key(obj)), reverse=sort.startswith('-'))
+            objects = objects[:pageSize]
+
+        return objects
+
+    @classmethod
+    def load_raw(cls, sort=None, pageSize=100, serializeNulls=False, concurrency=1, params=None):
+        """
+        Like load() but returns the entities as returned by the public
+        API (a list of dictionaries)
+        """
+        pages = cls._load_pages(sort=sort, pageSize=pageSize, serializeNulls=serializeNulls,
+                concurrency=concurrency, params=params)
+
+        return [ p for page in pages for p in page ]
+
+    @classmethod
+    def _load_pages(cls, sort, pageSize, serializeNulls, concurrency, params):
+        """
+        Returns the pages for load() and load_raw(). Pages fetched by
+        threads are lists, otherwise every page is streamed
+        """
+        cls.check_fetch()
 
         if pageSize > 500:
             pageSize = 500
 
+        if params is None:
+            params = {}
+
         num_of_pages = 1
 
         if pageSize == -1:
-            api = cls.__api__.call('%s/count' % cls.__fetch_command__, 'GET')
+            count_params = { k: v for k, v in params.items() if k != 'properties' }
+            api = cls.__api__.call('%s/count' % cls.__fetch_command__, 'GET', query=count_params)
             length = api['result']
             num_of_pages = math.ceil(length / 500)
             pageSize = 500
 
-        res = []
-        for i in range(num_of_pages):
-            query = {
-                'page': i+1,
-            }
-            if sort:
-                query['sort'] = sort
+        def fetch_page(page):
+            return cls.fetch_page(page, sort=sort, pageSize=pageSize, serializeNulls=serializeNulls, params=params)
 
-            query['pageSize'] = pageSize
+        def iter_page(page):
+            return cls.iter_page(page, sort=sort, pageSize=pageSize, serializeNulls=serializeNulls, params=params)
 
-            if serializeNulls:
-                query['serializeNulls'] = 1
+        pages = range(1, num_of_pages + 1)
 
-            data = cls.__api__.call(cls.__fetch_command__, cls.__method__, query=query,
+        if concurrency > 1 and num_of_pages > 1:
+            workers = min(concurrency, num_of_pages)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(fetch_page, pages))
+
+        return map(iter_page, pages)
+
+    @classmethod
+    def query(cls):
+        """
+        Returns a weclapp.models.query.Query for this model, which
+        supports filters, sorting, field projection and a limit and
+        yields the objects page by page
+        """
+        return Query(cls)
+
+    @classmethod
+    def iter_raw(cls, sort=None, pageSize=500, serializeNulls=False, params=None):
+        """
+        Yields the entities as returned by the public API page by page.
+        Every page is a list of dictionaries, the next page is fetched
+        while the current one is processed. The pages are fetched until
+        a page is not full, no /count call is needed.
+
+        pageSize is capped at 500
+        """
+        query = cls.query().where(params).page_size(pageSize).serialize_nulls(serializeNulls)
+        if sort:
+            query.sort(sort)
+
+        return query.iter_pages(raw=True)
+
+    @classmethod
+    def fetch_page(cls, page, sort=None, pageSize=100, serializeNulls=False, params=None):
+        """
+        Fetches one page and returns the list of entities
+        """
+        return list(cls.iter_page(page, sort=sort, pageSize=pageSize, serializeNulls=serializeNulls, params=params))
+
+    @classmethod
+    def iter_page(cls, page, sort=None, pageSize=100, serializeNulls=False, params=None):
+        """
+        Fetches one page and yields the entities while the response
+        is received
+        """
+        query = cls.page_query(page, sort=sort, pageSize=pageSize, serializeNulls=serializeNulls, params=params)
+
+        return cls.__api__.stream(cls.__fetch_command__, cls.__method__, query=query,
+                expected_status_code=cls.__expect_status_code__)
+
+    @staticmethod
+    def page_query(page, sort=None, pageSize=100, serializeNulls=False, params=None):
+        """
+        Returns the query parameters to fetch a page
+        """
+        query = dict(params or {})
+        query['page'] = page
+
+        if sort:
+            query['sort'] = sort
+
+        query['pageSize'] = pageSize
+
+        if serializeNulls:
+            query['serializeNulls'] = 1
+
+        return query
+
+    @classmethod
+    async def load_async(cls, sort=None, pageSize=100, serializeNulls=False, params=None):
+        """
+        Coroutine version of load(), using __async_api__. All pages
+        are requested at once, the number of concurrent requests is
+        limited by the poolsize of the API object.
+        """
+        import asyncio
+
+        cls.check_fetch(asynchronous=True)
+
+        api = cls.__async_api__
+
+        if pageSize > 500:
+            pageSize = 500
+
+        params = dict(params or {})
+        if cls.__properties__:
+            params.setdefault('properties', cls.__properties__)
+
+        num_of_pages = 1
+
+        if pageSize == -1:
+            count_params = { k: v for k, v in params.items() if k != 'properties' }
+            data = await api.call('%s/count' % cls.__fetch_command__, 'GET', query=count_params)
+            num_of_pages = math.ceil(data['result'] / 500)
+            pageSize = 500
+
+        async def fetch_page(page):
+            query = cls.page_query(page, sort=sort, pageSize=pageSize, serializeNulls=serializeNulls, params=params)
+            data = await api.call(cls.__fetch_command__, cls.__method__, query=query,
                     expected_status_code=cls.__expect_status_code__)
+            return [ cls(**p) for p in data['result'] ]
+
+        pages = await asyncio.gather(*[ fetch_page(page) for page in range(1, num_of_pages + 1) ])
 
-            res += [ cls(**p) for p in data['result'] ]
+        return [ obj for page in pages for obj in page ]
 
-        return res
+    @classmethod
+    def check_fetch(cls, asynchronous=False):
+        """
+        Raises an exception if the objects cannot be fetched
+        """
+        api = cls.__async_api__ if asynchronous else cls.__api__
+        if api is None:
+            raise ApiNotLoaded('The API is not loaded, cannot fetch the data')
+
+        if cls.__fetch_command__ is None:
+            raise WrongFetchCommand('This class (%s) has no valid fetch command' % cls.__name__)
 
     def print(self, indent='', with_color=True, file=sys.stdout):
         """
@@ -0,0 +1,208 @@
+from array import array
+from datetime import datetime
+
+try:
+    import numpy
+except ImportError: # pragma: no cover
+    numpy = None
+
+
+class Category(object):
+    """
+    A dictionary encoded column: every distinct value gets a code,
+    the column stores the codes
+    """
+
+    def __init__(self):
+        self.codes = array('l')
+        self.values = []
+        self.index = {}
+
+    def append(self, value):
+        code = self.index.get(value, None)
+        if code is None:
+            code = len(self.values)
+            self.index[value] = code
+            self.values.append(value)
+
+        self.codes.append(code)
+
+
+class TimeRecordColumns(object):
+    """
+    Stores time records column by column for fast aggregations.
+
+    The durations and the start timestamps (milliseconds) are stored in
+    arrays, the project, task and user ids are dictionary encoded. Use
+    sum_by() to sum the durations per project, task, user and/or day.
+    NumPy is used for the aggregations when it is installed.
+
+        columns = WeclappTimeRecord.load_columns(pageSize=-1)
+        hours_per_task = columns.sum_by('task')
+    """
+
+    # group key -> API field
+    categories = {
+        'project': 'projectId',
+        'task': 'projectTaskId',
+        'user': 'userId',
+    }
+
+    # the API fields stored in the columns
+    properties = ','.join([ 'id', 'durationSeconds', 'startDate' ] + list(categories.values()))
+
+    def __init__(self):
+        self.ids = []
+        self.durations = array('q')
+        self.starts = array('q')
+        self.columns = { key: Category() for key in self.categories }
+        self._days = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, row):
+        """
+        Appends a time record. row is a time record as returned by the public API
+        """
+        self._days = None
+        self.ids.append(row.get('id', None))
+        self.durations.append(row['durationSeconds'])
+        self.starts.append(row['startDate'])
+
+        for key, field in self.categories.items():
+            self.columns[key].append(row.get(field, None))
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        columns = cls()
+        columns.extend(rows)
+        return columns
+
+    def group_codes(self, key):
+        """
+        Returns a tuple (codes, values) for the group key. codes
+        has a code for every time record, values[code] is the value.
+        """
+        if key in self.columns:
+            column = self.columns[key]
+            return (column.codes, column.values)
+
+        if key == 'day':
+            return self.day_codes()
+
+        raise KeyError('Unknown group key \'%s\'' % key)
+
+    def day_codes(self):
+        """
+        The day (local time) of the start of every time record
+        """
+        if self._days is None:
+            if numpy is not None:
+                self._days = self._day_codes_numpy()
+            else:
+                self._days = self._day_codes_python()
+
+        return self._days
+
+    def _day_codes_python(self):
+        codes = array('l')
+        values = []
+        days = {}
+        cache = {}
+
+        # records usually start at the same time of the day, the number
+        # of distinct timestamps is much smaller than the number of records
+        for ms in self.starts:
+            code = cache.get(ms, None)
+            if code is None:
+                day = datetime.fromtimestamp(ms // 1000).date()
+                code = days.get(day, None)
+                if code is None:
+                    code = len(values)
+                    days[day] = code
+                    values.append(day)
+                cache[ms] = code
+
+            codes.append(code)
+
+        return (codes, values)
+
+    def _day_codes_numpy(self):
+        starts, inverse = numpy.unique(numpy.frombuffer(self.starts, dtype=numpy.int64), return_inverse=True)
+
+        values = []
+        days = {}
+        start_codes = []
+        for ms in starts.tolist():
+            day = datetime.fromtimestamp(ms // 1000).date()
+            code = days.get(day, None)
+            if code is None:
+                code = len(values)
+                days[day] = code
+                values.append(day)
+            start_codes.append(code)
+
+        codes = numpy.array(start_codes, dtype=numpy.int64)[inverse.ravel()]
+
+        return (array('l', codes.tolist()), values)
+
+    def sum_by(self, *keys):
+        """
+        Sums the durations (seconds) grouped by keys. Valid keys are
+        'project', 'task', 'user' and 'day'.
+
+        Returns a dictionary, the keys are the group values (a tuple of
+        values when more than one key is passed)
+        """
+        if len(keys) == 0:
+            raise KeyError('No group key passed')
+
+        groups = [ self.group_codes(key) for key in keys ]
+
+        if numpy is not None:
+            totals = self._sum_numpy(groups)
+        else:
+            totals = self._sum_python(groups)
+
+        if len(keys) == 1:
+            values = groups[0][1]
+            return { values[codes[0]]: total for codes, total in totals.items() }
+
+        return { tuple(groups[i][1][c] for i, c in enumerate(codes)): total for codes, total in totals.items() }
+
+    def _sum_python(self, groups):
+        totals = {}
+
+        for codes, duration in zip(zip(*[ g[0] for g in groups ]), self.durations):
+            totals[codes] = totals.get(codes, 0) + duration
+
+        return totals
+
+    def _sum_numpy(self, groups):
+        if len(self) == 0:
+            return {}
+
+        durations = numpy.frombuffer(self.durations, dtype=numpy.int64)
+
+        # combine the codes of all keys into one code (mixed radix)
+        combined = numpy.zeros(len(self), dtype=numpy.int64)
+        for codes, values in groups:
+            combined = combined * len(values) + numpy.frombuffer(codes, dtype=numpy.dtype(codes.typecode))
+
+        combined, inverse = numpy.unique(combined, return_inverse=True)
+        sums = numpy.bincount(inverse.ravel(), weights=durations, minlength=len(combined))
+
+        totals = {}
+        for code, total in zip(combined.tolist(), sums.tolist()):
+            key = []
+            for codes, values in reversed(groups):
+                code, c = divmod(code, len(values))
+                key.append(c)
+            totals[tuple(reversed(key))] = int(total)
+
+        return totals
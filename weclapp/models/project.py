@@ -1,6 +1,8 @@
 import sys
 import logging
 
+from concurrent.futures import ThreadPoolExecutor
+
 from colorama import Fore, Back, Style
 
 from .base import WeclappBaseModel
@@ -15,18 +17,21 @@ class WeclappProject(WeclappBaseModel):
         ('projectNumber', str, False),
         ('billable', bool, False),
     ]
+    __extra_slots__ = [ 'tasks', 'task_ids', 'hide' ]
     __fetch_command__ = 'project'
 
     def setup(self, **kwargs):
         self.tasks = []
+        self.task_ids = set()
 
     def add_task(self, task):
-
-        tids = map(lambda r: r.id, self.tasks)
-
-        if task.id in tids:
+        """
+        Adds a task unless a task with the same id was already added
+        """
+        if task.id in self.task_ids:
             return
 
+        self.task_ids.add(task.id)
         self.tasks.append(task)
 
     def print(self, indent='', with_color=True, file=sys.stdout):
@@ -49,27 +54,194 @@ class WeclappProject(WeclappBaseModel):
         print(msg.format(indent, self.projectNumber, self.name, self.id, billable))
 
     @classmethod
-    def load(cls, tasks=True, time_records=100, **kwargs):
+    def load(cls, tasks=True, time_records=100, concurrency=1, store=None, time_record_params=None,
+            cache=None, **kwargs):
         """
         Loads projects
 
         params:
 
-            tasks         if set, load the project tasks and bind them to the projects
-            time_records  load the last n time records. If n is -1, then load all time
-                          records. If tasks is not set, this setting is ignored
-            kwargs        arguments accepted by the base class
+            tasks               if set, load the project tasks and bind them to the projects
+            time_records        load the last n time records. If n is -1, then load all time
+                                records. If tasks is not set, this setting is ignored
+            concurrency         number of pages fetched at the same time
+            store               if set, load everything from this weclapp.SyncStore
+                                instead of the public API
+            time_record_params  additional query parameters (filters) for the time records
+            cache               if set, load the projects and tasks from this
+                                weclapp.store.ReferenceCache, the time records are
+                                fetched from the public API. Ignored if store is set
+            kwargs              arguments accepted by the base class
         """
         from .task import WeclappTask             # avoiding circle dependencies
         from .timeRecord import WeclappTimeRecord # avoiding circle dependencies
-        projects = super().load(**kwargs)
+
+        if store is not None or kwargs.get('params', None):
+            # the cache holds all projects, filters are sent to the server
+            cache = None
 
         if not tasks:
-            return projects
+            return super().load(concurrency=concurrency, store=store if store is not None else cache, **kwargs)
 
-        projects_map = { p.id: p for p in projects }
+        load_time_records = time_records != 0
+
+        if cache is not None:
+            # the time records are fetched while the cache is checked
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                if load_time_records:
+                    time_records_future = executor.submit(WeclappTimeRecord.load, sort='-startDate',
+                            pageSize=time_records, concurrency=concurrency,
+                            params=time_record_params)
+
+                cache.update([ cls, WeclappTask ])
+                projects = super().load(store=cache, **kwargs)
+                tasks = WeclappTask.load(store=cache)
+
+                if load_time_records:
+                    time_records = time_records_future.result()
+        elif store is not None:
+            # the local store is fast and cannot be shared between threads
+            projects = super().load(store=store, **kwargs)
+            tasks = WeclappTask.load(store=store)
+            if load_time_records:
+                time_records = WeclappTimeRecord.load(sort='-startDate', pageSize=time_records, store=store,
+                        params=time_record_params)
+        else:
+            # the three fetches are independent until they are joined
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                projects_future = executor.submit(super().load, concurrency=concurrency, **kwargs)
+                tasks_future = executor.submit(WeclappTask.load, concurrency=concurrency)
+
+                if load_time_records:
+                    time_records_future = executor.submit(WeclappTimeRecord.load, sort='-startDate',
+                            pageSize=time_records, concurrency=concurrency,
+                            params=time_record_params)
+
+                projects = projects_future.result()
+                tasks = tasks_future.result()
+                if load_time_records:
+                    time_records = time_records_future.result()
+
+        if not load_time_records:
+            time_records = None
+
+        return cls.join(projects, tasks, time_records)
+
+    @classmethod
+    def load_matching(cls, query, time_records=100, concurrency=1, time_record_params=None, cache=None):
+        """
+        Loads the projects whose name or project number contains query
+        with all their tasks, and the projects of the tasks whose name
+        contains query with these tasks. The matching is done by the
+        server (case insensitive), so only the matching entities are
+        transferred.
+
+        params:
+
+            query               the text to look for
+            time_records        load the last n time records of the loaded tasks. If n is
+                                -1, then load all time records
+            concurrency         number of pages fetched at the same time
+            time_record_params  additional query parameters (filters) for the time records
+            cache               if set, the projects and tasks are loaded from this
+                                weclapp.store.ReferenceCache and matched locally
+        """
+        from .timeRecord import WeclappTimeRecord # avoiding circle dependencies
+
+        if cache is not None:
+            projects, tasks = cls.match_cached(query, cache)
+        else:
+            projects, tasks = cls.match_remote(query, concurrency)
+
+        projects = sorted(projects.values(), key=lambda p: p.projectNumber)
+        tasks = list(tasks.values())
+
+        if time_records == 0 or len(tasks) == 0:
+            return cls.join(projects, tasks, None)
+
+        time_records = WeclappTimeRecord.load_in('projectTaskId', [ t.id for t in tasks ], sort='-startDate',
+                pageSize=time_records, concurrency=concurrency, params=time_record_params)
+
+        return cls.join(projects, tasks, time_records)
+
+    @classmethod
+    def match_cached(cls, query, cache):
+        """
+        Returns the projects and tasks of load_matching() out of the
+        cache, two dictionaries id -> object
+        """
+        from .task import WeclappTask # avoiding circle dependencies
+
+        cache.update([ cls, WeclappTask ])
+        all_projects = cache.load(cls)
+        all_tasks = cache.load(WeclappTask)
+
+        # like the name-ilike filters of the public API
+        query = query.lower()
+
+        projects = { p.id: p for p in all_projects
+                if query in p.name.lower() or query in p.projectNumber.lower() }
+        tasks = { t.id: t for t in all_tasks if query in t.name.lower() }
+
+        missing = set(t.projectId for t in tasks.values()) - set(projects)
+
+        tasks.update((t.id, t) for t in all_tasks if t.projectId in projects)
+        projects.update((p.id, p) for p in all_projects if p.id in missing)
+
+        return (projects, tasks)
+
+    @classmethod
+    def match_remote(cls, query, concurrency):
+        """
+        Returns the projects and tasks of load_matching() fetched with
+        server side filters, two dictionaries id -> object
+        """
+        from .task import WeclappTask # avoiding circle dependencies
+
+        like = '%%%s%%' % query
+
+        def load(klass, params, **kwargs):
+            return klass.load(pageSize=-1, concurrency=concurrency, params=params, **kwargs)
+
+        def load_in(klass, field, values, **kwargs):
+            return klass.load_in(field, values, concurrency=concurrency, **kwargs)
 
-        tasks = WeclappTask.load()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            by_name = executor.submit(load, cls, { 'name-ilike': like }, tasks=False)
+            by_number = executor.submit(load, cls, { 'projectNumber-ilike': like }, tasks=False)
+            matching_tasks = executor.submit(load, WeclappTask, { 'name-ilike': like })
+
+            projects = { p.id: p for p in by_name.result() + by_number.result() }
+            tasks = { t.id: t for t in matching_tasks.result() }
+
+            # all tasks of the matching projects and the projects of the matching tasks
+            missing = set(t.projectId for t in tasks.values()) - set(projects)
+
+            project_tasks = None
+            if len(projects) > 0:
+                project_tasks = executor.submit(load_in, WeclappTask, 'projectId', projects)
+
+            task_projects = None
+            if len(missing) > 0:
+                task_projects = executor.submit(load_in, cls, 'id', missing, tasks=False)
+
+            if project_tasks is not None:
+                tasks.update((t.id, t) for t in project_tasks.result())
+
+            if task_projects is not None:
+                projects.update((p.id, p) for p in task_projects.result())
+
+        return (projects, tasks)
+
+    @classmethod
+    def join(cls, projects, tasks, time_records=None):
+        """
+        Binds the tasks to the projects and the time records to the
+        tasks. Returns the projects.
+        """
+        from .task import WeclappTask # avoiding circle dependencies
+
+        projects_map = { p.id: p for p in projects }
 
         for task in tasks:
             proj = projects_map.get(task.projectId, None)
@@ -80,26 +252,20 @@ class WeclappProject(WeclappBaseModel):
             proj.add_task(task)
             task.project = proj
 
-        if time_records == 0:
+        if time_records is None:
             return projects
 
-        tasks_map = { t.id: t for t in tasks }
+        orphans = WeclappTask.bind_time_records(tasks, time_records)
 
-        time_records = WeclappTimeRecord.load(sort='-startDate', pageSize=time_records, serializeNulls=True)
+        for tr in orphans:
+            log.debug('No task loaded for the time record %s with projectTaskId %s', tr.id, tr.projectTaskId)
 
         for tr in time_records:
-            task = tasks_map.get(tr.projectTaskId, None)
-            if task is None:
-                log.debug('No task loaded for the time record %s with projectTaskId %s', tr.id, tr.projectTaskId)
-            proj = projects_map.get(tr.projectId, None)
-            if proj is None:
+            if tr.projectId not in projects_map:
                 log.debug('No project loaded for time record %s with projectId %s', tr.id, tr.projectId)
 
-            task.add_time_record(tr)
-            tr.task = task
-
         # sorting
         for task in tasks:
-            task.time_records = sorted(task.time_records, key=lambda r: r.startDate, reverse=True)
+            task.time_records = sorted(task.time_records, key=lambda r: r.millis('startDate'), reverse=True)
 
         return projects
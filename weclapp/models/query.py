@@ -0,0 +1,209 @@
+import json
+
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+class Query(object):
+    """
+    Builds a query for the public API of a model class. Create it with
+    Model.query(), all methods return the query itself, so they can be
+    chained:
+
+        records = WeclappTimeRecord.query() \\
+                .filter('startDate', since, 'ge') \\
+                .sort('-startDate') \\
+                .limit(1000)
+
+        for record in records:
+            ...
+
+    The objects are fetched page by page while iterating. The next page is
+    fetched in the background while the current one is processed, so at
+    most two pages are held in memory.
+
+    Unless only() is used, the objects are created out of the fields in
+    the __fields__ of the model and nothing else is fetched. iter_raw()
+    fetches the whole entities.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.filters = {}
+        self.sorting = []
+        self.properties = None
+        self.max_results = None
+        self.size = 500
+        self.nulls = False
+
+    def filter(self, field, value, op='eq'):
+        """
+        Adds a filter, it is sent as <field>-<op>=<value>
+
+        params:
+
+            field  the field of the entity
+            value  the value, lists are sent as JSON arrays (for the
+                   in and notin operators), datetime objects as
+                   milliseconds
+            op     the operator: eq, ne, lt, gt, le, ge, like, ilike,
+                   notlike, notilike, null, notnull, in, notin
+
+        See https://www.weclapp.com/api2/ for all operators
+        """
+        if isinstance(value, (list, tuple, set)):
+            value = json.dumps(list(value))
+        elif isinstance(value, bool):
+            value = str(value).lower()
+        elif isinstance(value, datetime):
+            value = int(value.timestamp() * 1000)
+
+        self.filters['%s-%s' % (field, op)] = value
+        return self
+
+    def where(self, params):
+        """
+        Adds query parameters as they are passed to the public API,
+        for example { 'projectTaskId-eq': '42' }
+        """
+        if params:
+            self.filters.update(params)
+        return self
+
+    def sort(self, *fields):
+        """
+        Sorts by the given fields, prefix a field with '-' for
+        descending order
+        """
+        self.sorting += fields
+        return self
+
+    def only(self, *fields):
+        """
+        Fetches only the given fields of the entities. The objects are
+        created out of these fields, so all fields the model requires
+        must be included. Use iter_raw() for other fields.
+        """
+        self.properties = list(fields)
+        return self
+
+    def limit(self, max_results):
+        """
+        Returns at most max_results objects
+        """
+        self.max_results = max(0, max_results)
+        return self
+
+    def page_size(self, size):
+        """
+        Number of entities fetched with one request, capped at 500
+        """
+        self.size = min(max(1, size), 500)
+        return self
+
+    def serialize_nulls(self, serialize=True):
+        """
+        Whether the public API includes fields which are NULL, the
+        default is False
+        """
+        self.nulls = serialize
+        return self
+
+    def params(self, raw=False):
+        """
+        Returns the filter and projection parameters of the query
+        """
+        params = dict(self.filters)
+
+        if self.properties:
+            params['properties'] = ','.join(self.properties)
+        elif not raw and self.model.__properties__:
+            params['properties'] = self.model.__properties__
+
+        return params
+
+    def count(self):
+        """
+        Returns the number of matching entities (limit is ignored)
+        """
+        self.model.check_fetch()
+
+        data = self.model.__api__.call('%s/count' % self.model.__fetch_command__, 'GET', query=self.filters)
+        return data['result']
+
+    def iter_pages(self, raw=False):
+        """
+        Yields the results page by page, every page is a list of objects
+        or, if raw is True, of the entities as returned by the public API.
+        The next page is fetched in the background while the current one
+        is processed. The pages are fetched until a page is not full, no
+        /count call is needed.
+        """
+        self.model.check_fetch()
+
+        remaining = self.max_results
+        if remaining == 0:
+            return
+
+        pageSize = self.size if remaining is None else min(self.size, remaining)
+        sort = ','.join(self.sorting) or None
+        params = self.params(raw)
+
+        def fetch(page):
+            return self.model.fetch_page(page, sort=sort, pageSize=pageSize,
+                    serializeNulls=self.nulls, params=params)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(fetch, 1)
+        page = 1
+
+        try:
+            while future is not None:
+                data = future.result()
+                last = len(data) < pageSize
+
+                if remaining is not None:
+                    data = data[:remaining]
+                    remaining -= len(data)
+                    last = last or remaining <= 0
+
+                page += 1
+                future = None if last else executor.submit(fetch, page)
+
+                if len(data) > 0:
+                    yield data if raw else [ self.model(**e) for e in data ]
+        finally:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def iter(self):
+        """
+        Yields the objects one by one
+        """
+        for page in self.iter_pages():
+            yield from page
+
+    def iter_raw(self):
+        """
+        Yields the entities as returned by the public API one by one
+        """
+        for page in self.iter_pages(raw=True):
+            yield from page
+
+    def __iter__(self):
+        return self.iter()
+
+    def all(self):
+        """
+        Returns a list of all objects
+        """
+        return list(self.iter())
+
+    def first(self):
+        """
+        Returns the first object or None
+        """
+        self.limit(1)
+        for obj in self.iter():
+            return obj
+        return None
@@ -11,21 +11,54 @@ class WeclappTask(WeclappBaseModel):
         ('name', str, False),
         ('projectId', str, False),
     ]
+    __extra_slots__ = [ 'time_records', 'time_record_ids', 'project', 'hide' ]
     __fetch_command__ = 'projectTask'
 
     def setup(self, **kwargs):
         self.time_records = []
+        self.time_record_ids = set()
         self.project = None
 
     def add_time_record(self, record):
+        """
+        Adds a time record unless a record with the same id was already
+        added. Records without an id (not uploaded yet) are always added.
+        """
+        if record.id is not None:
+            if record.id in self.time_record_ids:
+                return
 
-        rids = map(lambda r: r.id, self.time_records)
-
-        if record.id in rids:
-            return
+            self.time_record_ids.add(record.id)
 
         self.time_records.append(record)
 
+    @staticmethod
+    def bind_time_records(tasks, time_records):
+        """
+        Groups the time records by projectTaskId in one pass and binds
+        them to the matching tasks.
+
+        returns the list of time records that have no matching task
+        """
+        groups = {}
+        for tr in time_records:
+            groups.setdefault(tr.projectTaskId, []).append(tr)
+
+        orphans = []
+        tasks_map = { t.id: t for t in tasks }
+
+        for taskId, records in groups.items():
+            task = tasks_map.get(taskId, None)
+            if task is None:
+                orphans += records
+                continue
+
+            for tr in records:
+                task.add_time_record(tr)
+                tr.task = task
+
+        return orphans
+
     def print(self, indent='  ', with_color=True, file=sys.stdout):
         msg = '{}{:38s}[ID: {}]'
         if with_color:
@@ -3,8 +3,7 @@ import json
 import logging
 
 from .base import WeclappBaseModel
-
-from datetime import datetime
+from .exceptions import ApiNotLoaded
 
 log = logging.getLogger("weclapp-cli")
 
@@ -22,32 +21,46 @@ class WeclappTimeRecord(WeclappBaseModel):
         ('startDate', int, False),
         ('description', str, True),
     ]
+    __timestamps__ = [ 'createdDate', 'lastModifiedDate', 'startDate' ]
+    # source: (filename, line) of a parsed record, None if unknown
+    # __dict__: parsers may set their own attributes, the dictionary is
+    # only created when they do
+    __extra_slots__ = [ 'task', 'source', '__dict__' ]
     __fetch_command__ = 'timeRecord'
 
     def setup(self, **kwargs):
         self.task = None
-
-        if self.createdDate:
-            self.createdDate = datetime.fromtimestamp(int(self.createdDate) // 1000)
-
-        if self.lastModifiedDate:
-            self.lastModifiedDate = datetime.fromtimestamp(int(self.lastModifiedDate) // 1000)
-
-        if self.startDate:
-            self.startDate = datetime.fromtimestamp(int(self.startDate) // 1000)
+        self.source = None
 
         if self.description is None:
             self.description = ''
 
         self.description = self.description.strip()
 
+    @classmethod
+    def load_columns(cls, **kwargs):
+        """
+        Loads time records like load() but returns them as a
+        weclapp.TimeRecordColumns object without creating a
+        WeclappTimeRecord object per record
+
+        kwargs are the arguments accepted by load_raw(), only the fields
+        stored in the columns are fetched
+        """
+        from .columns import TimeRecordColumns # avoiding circle dependencies
+
+        kwargs['params'] = dict(kwargs.get('params', None) or {})
+        kwargs['params'].setdefault('properties', TimeRecordColumns.properties)
+
+        return TimeRecordColumns.from_rows(cls.load_raw(**kwargs))
+
     def dict_for_upload(self):
         ret = {}
 
         for field in ['billable', 'projectId', 'projectTaskId', 'durationSeconds' ]:
             ret[field] = getattr(self, field)
 
-        ret['startDate'] = int(self.startDate.timestamp() * 1000)
+        ret['startDate'] = self.millis('startDate')
 
         if isinstance(self.description, str) and self.description.strip() != '':
             ret['description'] = self.description
@@ -79,21 +92,82 @@ class WeclappTimeRecord(WeclappBaseModel):
 
         print(msg.format(indent, proj, task, str(self.startDate), hours, plural, desc), file=file)
 
-    def upload_to_weclapp(self):
+    def upload(self):
         """
         uploads the time record to weclapp
 
         You can only upload time reports without a valid id
 
-        returns the newly created time report, None otherwise
+        returns the newly created time report, raises weclapp.WeclappError
+        on failure
         """
 
         body = json.dumps(self.dict_for_upload())
 
+        res = self.__api__.call(self.__fetch_command__, 'POST', body=body, expected_status_code=201)
+
+        return type(self)(**res)
+
+    def upload_to_weclapp(self):
+        """
+        uploads the time record to weclapp
+
+        You can only upload time reports without a valid id
+
+        returns the newly created time report, None otherwise
+        """
         try:
-            res = self.__api__.call(self.__fetch_command__, 'POST', body=body, expected_status_code=201)
+            return self.upload()
         except:
             log.debug('Failed to upload the time record', exc_info=True)
             return None
 
+    async def upload_async(self):
+        """
+        Coroutine version of upload(), using __async_api__
+        """
+        if self.__async_api__ is None:
+            raise ApiNotLoaded('The API is not loaded, cannot upload the time record')
+
+        body = json.dumps(self.dict_for_upload())
+
+        res = await self.__async_api__.call(self.__fetch_command__, 'POST', body=body, expected_status_code=201)
+
         return type(self)(**res)
+
+    @classmethod
+    async def upload_batch_async(cls, records):
+        """
+        Uploads the time records with pipelined requests over one
+        connection of __async_api__, see AsyncWeclappAPI.call_batch()
+
+        returns a list with the newly created time record or the
+        exception of every record, in the order of records
+        """
+        if cls.__async_api__ is None:
+            raise ApiNotLoaded('The API is not loaded, cannot upload the time records')
+
+        bodies = [ json.dumps(record.dict_for_upload()) for record in records ]
+
+        results = await cls.__async_api__.call_batch(cls.__fetch_command__, 'POST', bodies, expected_status_code=201)
+
+        uploaded = []
+        for res in results:
+            if not isinstance(res, Exception):
+                try:
+                    res = cls(**res)
+                except Exception as e:
+                    res = e
+            uploaded.append(res)
+
+        return uploaded
+
+    async def upload_to_weclapp_async(self):
+        """
+        Coroutine version of upload_to_weclapp(), using __async_api__
+        """
+        try:
+            return await self.upload_async()
+        except Exception:
+            log.debug('Failed to upload the time record', exc_info=True)
+            return None
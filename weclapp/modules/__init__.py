@@ -1,4 +1,13 @@
-from .config import ConfigModule
-from .project import ProjectModule
-from .upload import UploadModule
 from .exceptions import *
+from ..lazy import lazy_attributes
+
+_lazy = {
+    'ConfigModule': '.config',
+    'ProjectModule': '.project',
+    'UploadModule': '.upload',
+    'ReportModule': '.report',
+    'ServeModule': '.serve',
+}
+
+__getattr__ = lazy_attributes(__name__, _lazy)
+__all__ = exceptions.__all__ + list(_lazy)
@@ -1,5 +1,8 @@
+from datetime import datetime, timedelta
+
 from ..config import Config
 from .. import WeclappBaseException, ConfigInvalid
+from .exceptions import InvalidCLIArguments
 
 class BaseModule(object):
     """
@@ -10,6 +13,10 @@ class BaseModule(object):
     cmdline_opts = {}
     autoload_api = True
 
+    # the weclapp.SyncStore of the daemon (weclapp-cli serve) when
+    # the command is run by it
+    store = None
+
     def __init__(self, app, namespace, config):
         self.app = app
         self.namespace = namespace
@@ -21,3 +28,57 @@ class BaseModule(object):
 
     def run(self, namespace):
         raise Exception('The run method has to be overriden')
+
+    def reference_cache(self):
+        """
+        Returns the cache of the projects and tasks (cache.sqlite next
+        to the configuration file). Returns None when the command is run
+        by the daemon, its store is used instead.
+
+        The cache must be used by the thread that created it
+        """
+        from ..store import ReferenceCache, def_cache_path
+
+        if self.store is not None:
+            return None
+
+        return ReferenceCache(def_cache_path(self.namespace.config), ttl=Config.optional_value(self.config, 'cache_ttl'),
+                refresh=getattr(self.namespace, 'refresh', False),
+                concurrency=getattr(self.namespace, 'concurrency', 1))
+
+
+def parse_date_option(value, option, next_day=False):
+    """
+    Parses the date of a command line option and returns the JavaScript
+    timestamp (milliseconds) of the start of the day (local time). If
+    next_day is set, the start of the following day is returned.
+    """
+    from dateutil.parser import parse as date_parse
+
+    try:
+        day = date_parse(value).date()
+    except (ValueError, OverflowError):
+        raise InvalidCLIArguments('%s is invalid. \'%s\' is not a date' % (option, value))
+
+    start = datetime.fromordinal(day.toordinal())
+    if next_day:
+        start += timedelta(days=1)
+
+    return int(start.timestamp() * 1000)
+
+
+def date_range_params(since, until):
+    """
+    Returns the API filter parameters for time records that start
+    between since and until (both inclusive)
+    """
+    params = {}
+
+    if since:
+        params['startDate-ge'] = parse_date_option(since, '--since')
+
+    if until:
+        # until is inclusive, so filter for start dates before the next day
+        params['startDate-lt'] = parse_date_option(until, '--until', next_day=True)
+
+    return params
@@ -61,6 +61,12 @@ class ConfigModule(BaseModule):
 
         args = {}
 
+        # keep the optional values of the existing configuration
+        if cfg.config is not None:
+            for key, _, _, _ in Config.optional_config_values:
+                if key in cfg.config:
+                    args[key] = cfg.config[key]
+
         if self.namespace.domain is not None:
             args['domain'] = self.namespace.domain
 
@@ -1,8 +1,10 @@
 from argparse import RawTextHelpFormatter
 from colorama import Style
 
-from .base import BaseModule
-from ..models import WeclappProject
+from .base import BaseModule, date_range_params
+from ..config import Config
+from ..models import WeclappProject, WeclappTask, WeclappTimeRecord
+from ..store import SyncStore, def_store_path
 from .exceptions import InvalidCLIArguments
 
 basehelp = 'Print information about the projects and tasks'
@@ -11,6 +13,14 @@ If you use --projects-only or --projects-with-tasks then time
 records are not fetched.
 
 If you want to display all time records, then use --last all
+
+The projects and tasks are cached in cache.sqlite next to the
+configuration file. After cache_ttl seconds (configuration, default
+600) two tiny requests check whether they changed. Use --refresh to
+fetch them again.
+
+--query, --since and --until are sent to the server as filters,
+only the matching projects, tasks and time records are fetched.
 """
 
 class ProjectModule(BaseModule):
@@ -36,6 +46,24 @@ class ProjectModule(BaseModule):
         parser.add_argument('-q', '--query', action='store', default='', dest='query', metavar='QUERY',
                 help='Filter projects and tasks by query.\nDisplays the projects & tasks that contains the query.')
 
+        parser.add_argument('--since', action='store', dest='since', metavar='DATE',
+                help='Show only time records that start on or after DATE')
+
+        parser.add_argument('--until', action='store', dest='until', metavar='DATE',
+                help='Show only time records that start on or before DATE')
+
+        parser.add_argument('--concurrency', action='store', type=int, default=4, dest='concurrency', metavar='N',
+                help='Fetch up to N pages at the same time. Default 4')
+
+        parser.add_argument('-s', '--sync', action='store_true', default=False, dest='sync',
+                help='Synchronize the local store with the changes since the last\nsync and show the data of the local store')
+
+        parser.add_argument('--reconcile', action='store_true', default=False, dest='reconcile',
+                help='Force a full reconciliation of the local store.\nImplies --sync')
+
+        parser.add_argument('--refresh', action='store_true', default=False, dest='refresh',
+                help='Fetch the projects and tasks again instead of using the cache')
+
         parser.add_argument('--no-color', action='store_true', default=False, dest='nocolor',
                 help='Disable colored output')
         parser.set_defaults(module = ProjectModule)
@@ -56,16 +84,32 @@ class ProjectModule(BaseModule):
         if self.namespace.projects_only or self.namespace.projects_and_tasks:
             time_records = 0
 
+        if self.namespace.concurrency < 1:
+            raise InvalidCLIArguments('--concurrency is invalid. It only can be a positive number')
+
         kwargs = {
             'time_records': time_records,
-            'tasks': not self.namespace.projects_only,
+            'concurrency': self.namespace.concurrency,
+            'time_record_params': date_range_params(self.namespace.since, self.namespace.until),
         }
 
-        projects = WeclappProject.load(**kwargs)
+        query = self.namespace.query.strip()
+
+        store = self.store
+        if store is None and (self.namespace.sync or self.namespace.reconcile):
+            store = self.sync_store()
+
+        if store is not None:
+            projects = WeclappProject.load(tasks=not self.namespace.projects_only, store=store, **kwargs)
+        elif query != '' and not self.namespace.projects_only:
+            # the server does the filtering, filter_query only marks what is shown
+            projects = WeclappProject.load_matching(query, cache=self.reference_cache(), **kwargs)
+        else:
+            projects = WeclappProject.load(tasks=not self.namespace.projects_only,
+                    cache=self.reference_cache(), **kwargs)
 
         self.mark_all_to_show(projects)
 
-        query = self.namespace.query.strip()
         if query != '':
             filter_query(projects, query)
 
@@ -100,6 +144,18 @@ class ProjectModule(BaseModule):
                     print(msg)
         return 0
 
+    def sync_store(self):
+        """
+        Synchronizes and returns the local store
+        """
+        store = SyncStore(def_store_path(self.namespace.config),
+                reconcile_interval=Config.optional_value(self.config, 'reconcile_interval'))
+
+        store.sync([ WeclappProject, WeclappTask, WeclappTimeRecord ], reconcile=self.namespace.reconcile,
+                concurrency=self.namespace.concurrency)
+
+        return store
+
     def mark_all_to_show(self, projects):
         for proj in projects:
             proj.hide = False
@@ -0,0 +1,112 @@
+import sys
+
+from argparse import RawTextHelpFormatter
+from concurrent.futures import ThreadPoolExecutor
+from colorama import Style
+
+from .base import BaseModule, date_range_params
+from ..models import WeclappProject, WeclappTask, WeclappTimeRecord
+from ..report import Report
+
+basehelp = 'Print the total time of the time records grouped by project, task, user, week or month'
+epilog = """
+The time records are fetched page by page and only the totals
+are kept in memory. Use --since and --until to let the server
+filter the time records by their start date.
+
+Example: monthly hours per project in 2019
+
+    weclapp-cli report --by month --by project --since 2019-01-01 --until 2019-12-31
+"""
+
+class ReportModule(BaseModule):
+    name = 'report'
+    cmdline_opts = {
+        'help': basehelp,
+        'description': basehelp,
+        'epilog': epilog,
+        'formatter_class': RawTextHelpFormatter,
+    }
+
+    @staticmethod
+    def init_argparser(parser):
+        parser.add_argument('-b', '--by', action='append', dest='by', choices=Report.groups,
+                help='Group the time records by this key. You can use --by multiple times.\nDefault: --by project --by task')
+
+        parser.add_argument('--since', action='store', dest='since', metavar='DATE',
+                help='Only time records that start on or after DATE')
+
+        parser.add_argument('--until', action='store', dest='until', metavar='DATE',
+                help='Only time records that start on or before DATE')
+
+        parser.add_argument('--refresh', action='store_true', default=False, dest='refresh',
+                help='Fetch the names of the projects and tasks again instead of using the cache')
+
+        parser.add_argument('--no-color', action='store_true', default=False, dest='nocolor',
+                help='Disable colored output')
+        parser.set_defaults(module = ReportModule)
+
+    def run(self):
+        keys = self.namespace.by or [ 'project', 'task' ]
+
+        params = date_range_params(self.namespace.since, self.namespace.until)
+
+        report = Report(keys)
+        params['properties'] = report.properties()
+
+        if self.store is not None:
+            report.add_pages([ self.store.load_raw(WeclappTimeRecord, sort='startDate', params=params) ])
+            names = self.load_names(keys)
+        else:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # the names are only needed for the output
+                names = executor.submit(self.load_names, keys)
+
+                report.add_pages(WeclappTimeRecord.iter_raw(sort='startDate', params=params))
+
+                names = names.result()
+
+        self.print_report(report, names)
+        return 0
+
+    def load_names(self, keys):
+        """
+        Returns a dictionary with the project and task names by id
+        """
+        names = {}
+
+        # created here, load_names runs in a thread
+        store = self.store if self.store is not None else self.reference_cache()
+
+        if 'project' in keys:
+            for proj in WeclappProject.load(tasks=False, pageSize=-1, store=store):
+                names[('project', proj.id)] = '%s %s' % (proj.projectNumber, proj.name)
+
+        if 'task' in keys:
+            for task in WeclappTask.load(pageSize=-1, store=store):
+                names[('task', task.id)] = task.name
+
+        return names
+
+    def print_report(self, report, names, file=sys.stdout):
+        with_color = not self.namespace.nocolor
+
+        fmt = '{:30s}' * len(report.keys) + '{:>10s}'
+
+        header = fmt.format(*([ k.upper() for k in report.keys ] + [ 'HOURS' ]))
+        if with_color:
+            header = Style.BRIGHT + header + Style.RESET_ALL
+        print(header, file=file)
+
+        for key, seconds in report.rows():
+            labels = []
+            for group, value in zip(report.keys, key):
+                label = names.get((group, value), value)
+                labels.append('-' if label is None else str(label)[0:29])
+
+            print(fmt.format(*(labels + [ '%.2f' % (seconds / 3600) ])), file=file)
+
+        total = fmt.format(*([ 'TOTAL' ] + [ '' ] * (len(report.keys) - 1) + [ '%.2f' % (report.total / 3600) ]))
+        if with_color:
+            total = Style.BRIGHT + total + Style.RESET_ALL
+        print(total, file=file)
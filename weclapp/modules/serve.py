@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import signal
+import logging
+
+from argparse import RawTextHelpFormatter
+
+from .base import BaseModule
+from ..config import Config
+from .exceptions import InvalidCLIArguments
+from ..exception import WeclappBaseException, PrintHelp
+from ..server import Server, def_socket_path
+
+log = logging.getLogger("weclapp-cli")
+
+basehelp = 'Run a daemon that answers the projects, report and upload commands'
+
+epilog = '''
+The daemon keeps the connections to the API and an in-memory copy of the
+projects, tasks and time records. While it is running, the projects, report
+and upload commands of the same configuration are run by the daemon.
+
+The in-memory copy is synchronized with the changes since the last
+synchronization when it is older than --max-age seconds and after uploads.
+'''
+
+class ServeModule(BaseModule):
+    name = 'serve'
+    cmdline_opts = {
+        'help': basehelp,
+        'description': basehelp,
+        'epilog': epilog,
+        'formatter_class': RawTextHelpFormatter,
+    }
+
+    @staticmethod
+    def init_argparser(parser):
+        parser.add_argument('--socket', action='store', dest='socket', metavar='PATH',
+                help='The path of the Unix socket. Default weclapp-cli.sock next to the configuration file')
+
+        parser.add_argument('--max-age', action='store', type=int, default=60, dest='max_age', metavar='SECONDS',
+                help='Synchronize the in-memory copy before a command when it is older than SECONDS.\nDefault 60')
+
+        parser.add_argument('--concurrency', action='store', type=int, default=4, dest='concurrency', metavar='N',
+                help='Fetch up to N pages at the same time. Default 4')
+        parser.set_defaults(module = ServeModule)
+
+    def run(self):
+        from colorama import deinit
+        from ..store import SyncStore
+        from ..models import WeclappProject, WeclappTask, WeclappTimeRecord
+
+        if self.namespace.max_age < 0:
+            raise InvalidCLIArguments('--max-age is invalid. It only can be a positive number or 0')
+
+        if self.namespace.concurrency < 1:
+            raise InvalidCLIArguments('--concurrency is invalid. It only can be a positive number')
+
+        # the clients decide about colors (--no-color)
+        deinit()
+
+        self.config_path = os.path.abspath(self.namespace.config)
+        self.classes = [ WeclappProject, WeclappTask, WeclappTimeRecord ]
+        self.store = SyncStore(':memory:', reconcile_interval=Config.optional_value(self.config, 'reconcile_interval'))
+        self.synced = None
+
+        start = time.time()
+        self.sync()
+        log.info('Loaded the projects, tasks and time records in %.2f seconds', time.time() - start)
+
+        path = self.namespace.socket or def_socket_path(self.config_path)
+        server = Server(path, self.handle)
+        server.listen()
+
+        print('Listening on %s' % path)
+        sys.stdout.flush()
+
+        # remove the socket when the daemon is terminated
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+        return 0
+
+    def sync(self, reconcile=False):
+        self.store.sync(self.classes, reconcile=reconcile, concurrency=self.namespace.concurrency)
+        self.synced = time.time()
+
+    def handle(self, request):
+        """
+        Runs the command of the request, returns the response
+        { 'status': exit status }, { 'error': message } if the command
+        failed or { 'refused': reason } if the client has to run the
+        command itself
+        """
+        from ..app import WeclappApp, served_commands
+
+        if request.get('config', None) != self.config_path:
+            return { 'refused': 'The daemon uses the configuration %s' % self.config_path }
+
+        args = request.get('args', [])
+        cwd = os.getcwd()
+
+        try:
+            os.chdir(request.get('cwd', cwd))
+
+            app = WeclappApp([ 'weclapp-cli' ] + args)
+            if app.command not in served_commands:
+                return { 'refused': 'The daemon does not run the command %s' % app.command }
+
+            try:
+                namespace = app.parser.parse_args(args)
+            except SystemExit as e:
+                # invalid arguments or --help
+                return { 'status': e.code }
+
+            status = self.run_command(app, namespace)
+        except PrintHelp as e:
+            print('%s\n----------------------------' % str(e), file=sys.stderr)
+            app.parser.print_help(file=sys.stderr)
+            status = 1
+        except WeclappBaseException as e:
+            # printed by the client
+            return { 'error': str(e) }
+        finally:
+            os.chdir(cwd)
+
+        return { 'status': status }
+
+    def run_command(self, app, namespace):
+        reconcile = getattr(namespace, 'reconcile', False)
+        if reconcile or self.synced is None or time.time() - self.synced >= self.namespace.max_age:
+            self.sync(reconcile=reconcile)
+
+        module = namespace.module(app, namespace, self.config)
+        module.store = self.store
+
+        try:
+            return module.run()
+        finally:
+            if app.command == 'upload':
+                # the uploaded time records are fetched by the next command
+                self.synced = None
@@ -2,14 +2,18 @@ import sys
 import os
 import logging
 
+from concurrent.futures import ProcessPoolExecutor
+
 from colorama import Style, Fore
 
 from ..parser.exceptions import FailedToParse
-from .exceptions import ParserNotFound
+from .exceptions import ParserNotFound, InvalidCLIArguments
 from ..exception import WeclappBaseException, PrintHelp
 from .base import BaseModule
 from ..parser import CSVParser, add_parser
 from ..parser.manage import parsers as weclapp_parsers
+from ..uploader import Uploader, Progress, DuplicateIndex, ProjectIndex
+from ..store import UploadJournal, def_journal_path
 
 log = logging.getLogger("weclapp-cli")
 
@@ -34,6 +38,22 @@ class UploadModule(BaseModule):
                 help='Show the parser options. Use --parser to set the parser, otherwise the default one is shown')
         parser.add_argument('--po', action='append', dest='po', metavar='OPT=VAL',
                 help='Parser options, you can use --po multiple times')
+        parser.add_argument('-j', '--jobs', action='store', type=int, default=1, dest='jobs', metavar='N',
+                help='Parse up to N files at the same time in separate processes. Default 1')
+        parser.add_argument('-w', '--workers', action='store', type=int, default=4, dest='workers', metavar='N',
+                help='Upload up to N time records at the same time. Default 4')
+        parser.add_argument('--batch-size', action='store', type=int, default=1, dest='batch_size', metavar='N',
+                help='Every worker sends N time records at once over its connection (HTTP pipelining).\nDefault 1')
+        parser.add_argument('--check-duplicates', action='store_true', default=False, dest='check_duplicates',
+                help='Fetch the time records in the date range of the files and skip the time records that already exist')
+        parser.add_argument('--no-check', action='store_true', default=False, dest='nocheck',
+                help='Do not check the projects and tasks of the time records before uploading them')
+        parser.add_argument('--refresh', action='store_true', default=False, dest='refresh',
+                help='Fetch the projects and tasks for the check again instead of using the cache')
+        parser.add_argument('--no-journal', action='store_true', default=False, dest='nojournal',
+                help='Do not use the upload journal, upload time records even if they were uploaded before')
+        parser.add_argument('--no-progress', action='store_true', default=False, dest='noprogress',
+                help='Do not show the upload progress on stderr')
         parser.add_argument('--no-color', action='store_true', default=False, dest='nocolor',
                 help='Disable colored output')
         parser.set_defaults(module = UploadModule)
@@ -78,25 +98,70 @@ class UploadModule(BaseModule):
 
         csv_parser = parser['parser'](options=parser_opts)
 
-        time_records = []
+        if self.namespace.workers < 1:
+            raise InvalidCLIArguments('--workers is invalid. It only can be a positive number')
 
-        for fn in self.namespace.files:
-            time_records += self.parseFile(csv_parser, fn)
+        if self.namespace.jobs < 1:
+            raise InvalidCLIArguments('--jobs is invalid. It only can be a positive number')
+
+        if self.namespace.batch_size < 1:
+            raise InvalidCLIArguments('--batch-size is invalid. It only can be a positive number')
+
+        self.failed_files = []
+        self.progress = None
+
+        # the records are parsed, checked and uploaded one by one
+        time_records = self.iter_records(csv_parser)
+
+        if not self.namespace.nocheck:
+            # project numbers are replaced by ids before the journal keys are computed
+            index = ProjectIndex.load(store=self.store if self.store is not None else self.reference_cache())
+            time_records = self.skip_invalid(index, time_records)
+
+        journal = None
+        self.skipped = 0
+        if not self.namespace.nojournal:
+            journal = UploadJournal(def_journal_path(self.namespace.config))
+            time_records = self.skip_committed(journal, time_records)
+
+        total = None
+        if self.namespace.check_duplicates:
+            # the date range of all records is needed
+            time_records = self.skip_duplicates(list(time_records))
+            total = len(time_records)
+
+        if not self.namespace.noprogress:
+            self.progress = Progress(total=total)
+
+        if self.namespace.batch_size > 1:
+            from ..asyncapi import AsyncWeclappAPI
+            from ..models.base import WeclappBaseModel
+
+            # a new one for every upload, it is bound to the event loop of the uploader
+            WeclappBaseModel.__async_api__ = AsyncWeclappAPI(dict(self.config, poolsize=self.namespace.workers))
+
+        uploader = Uploader(workers=self.namespace.workers, progress=self.progress, batch_size=self.namespace.batch_size)
 
         newtrs = []
-        for tr in time_records:
-            ans = tr.upload_to_weclapp()
-            if ans:
-                newtrs.append(ans)
+        for result in uploader.run(self.journaled(journal, time_records)):
+            if result.success:
+                if journal is not None:
+                    journal.commit(journal.key(result.record), result.uploaded.id)
+                newtrs.append(result.uploaded)
             else:
                 msg = "time record for project {}, task {} on {} with duration {} {} failed to be uploaded"
-                if not self.namespace.nocolor:
-                    msg = Fore.RED + msg + Style.RESET_ALL
-                hours = int(tr.durationSeconds / 3600)
-                plural = 'hours'
-                if hours == 1:
-                    plural = 'hour'
-                print(msg.format(tr.projectId, tr.projectTaskId, tr.startDate, hours, plural))
+                if result.status is not None:
+                    msg = msg + " (HTTP CODE {})".format(result.status)
+                self.print_record_msg(msg, result.record, Fore.RED)
+
+        if self.skipped > 0:
+            plural = 's'
+            if self.skipped == 1:
+                plural = ''
+            msg = "Skipped {} time record{} that were already uploaded".format(self.skipped, plural)
+            if not self.namespace.nocolor:
+                msg = Fore.YELLOW + msg + Style.RESET_ALL
+            print(msg)
 
         msg = "Succesfully uploaded time records"
         if not self.namespace.nocolor:
@@ -106,11 +171,158 @@ class UploadModule(BaseModule):
 
         for tr in newtrs:
             tr.print(indent='', with_color=not self.namespace.nocolor, with_projects=True)
+
+        if len(self.failed_files) > 0:
+            return 1
+
         return 0
 
-    def parseFile(self, csv_parser, filename):
-        return csv_parser.parseFile(filename)
+    def iter_records(self, csv_parser):
+        """
+        Yields the time records of all files in the order of the files.
+        Files that cannot be parsed are reported and skipped. If parsing
+        fails in the middle of a file, the time records read before the
+        error are yielded (and uploaded) and their number is reported.
+        """
+        if self.namespace.jobs > 1 and len(self.namespace.files) > 1:
+            yield from self.iter_records_parallel(csv_parser)
+            return
+
+        for fn in self.namespace.files:
+            count = 0
+            try:
+                for record in csv_parser.iterFile(fn):
+                    count += 1
+                    yield record
+            except WeclappBaseException as e:
+                self.file_failed(fn, e, count)
+
+    def iter_records_parallel(self, csv_parser):
+        """
+        Parses the files in a process pool and yields the time records
+        in the order of the files
+        """
+        files = self.namespace.files
+        workers = min(self.namespace.jobs, len(files))
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [ executor.submit(parse_file, csv_parser, fn) for fn in files ]
+
+            for fn, future in zip(files, futures):
+                records, error = future.result()
+
+                yield from records
+
+                if error is not None:
+                    self.file_failed(fn, error, len(records))
+
+    def file_failed(self, filename, error, count=0):
+        """
+        Reports a file that failed to parse, count is the number of
+        time records read before the error
+        """
+        log.debug('Failed to parse %s', filename, exc_info=error)
+        self.failed_files.append(filename)
+
+        msg = "Failed to parse {}: {}".format(filename, error)
+        if count > 0:
+            msg = msg + " (the {} time records before the error are uploaded)".format(count)
+        if not self.namespace.nocolor:
+            msg = Fore.RED + msg + Style.RESET_ALL
+
+        if self.progress is not None:
+            self.progress.clear()
+        print(msg, file=sys.stderr)
+
+    def skip_invalid(self, index, time_records):
+        """
+        Yields the time records whose project and task are valid, the
+        other ones are reported
+        """
+        for tr in time_records:
+            reason = index.check(tr)
+            if reason is not None:
+                msg = "time record for project {}, task {} on {} with duration {} {} rejected"
+                self.print_record_msg(msg, tr, Fore.RED, reason=reason)
+                continue
+
+            yield tr
+
+    def skip_committed(self, journal, time_records):
+        """
+        Yields the time records that are not committed in the journal
+        """
+        for tr in time_records:
+            if journal.is_committed(journal.key(tr)):
+                self.skipped += 1
+                continue
+
+            yield tr
+
+    def skip_duplicates(self, time_records):
+        """
+        Returns the time records that don't exist in weclapp yet
+        """
+        index = DuplicateIndex.load(time_records, concurrency=self.namespace.workers, store=self.store)
+        time_records, duplicates = index.split(time_records)
+
+        for tr in duplicates:
+            msg = "time record for project {}, task {} on {} with duration {} {} already exists, skipping"
+            self.print_record_msg(msg, tr, Fore.YELLOW)
+
+        return time_records
+
+    def print_record_msg(self, msg, tr, color, reason=None):
+        """
+        Prints msg formatted with the project, task, start date and
+        duration of the time record, prefixed with the file and line
+        of the record and followed by the reason
+        """
+        hours = int(tr.durationSeconds / 3600)
+        plural = 'hours'
+        if hours == 1:
+            plural = 'hour'
+        msg = msg.format(tr.projectId, tr.projectTaskId, tr.startDate, hours, plural)
+
+        if tr.source is not None:
+            msg = '[%s] line %d: %s' % (tr.source[0], tr.source[1], msg)
+
+        if reason is not None:
+            msg = '%s: %s' % (msg, reason)
+
+        if not self.namespace.nocolor:
+            msg = color + msg + Style.RESET_ALL
+
+        if self.progress is not None:
+            self.progress.clear()
+        print(msg, flush=True)
+
+    def journaled(self, journal, time_records):
+        """
+        Marks every time record as pending right before it is uploaded
+        """
+        for tr in time_records:
+            if journal is not None:
+                journal.begin(journal.key(tr), tr)
+            yield tr
+
+
+
+def parse_file(parser, filename):
+    """
+    Parses the file in a worker process of --jobs and returns a tuple
+    (records, error). error is the exception that stopped parsing,
+    records are the time records read before it, like iterFile()
+    yields them to the serial upload.
+    """
+    records = []
+    try:
+        for record in parser.iterFile(filename):
+            records.append(record)
+    except WeclappBaseException as e:
+        return (records, e)
 
+    return (records, None)
 
 
 def init_parsers(config, fn='csv_exporter.py'):
@@ -150,6 +362,9 @@ def load_plugin(module_name, path):
 
             mod = importlib.util.module_from_spec(spec)
             spec.loader.exec_module(mod)
+            # parsers are pickled by reference when files are parsed in
+            # a process pool, the module has to be found by its name
+            sys.modules[module_name] = mod
         elif (python_version_gte(3, 0)):
             from importlib.machinery import SourceFileLoader
             l = SourceFileLoader(module_name, path)
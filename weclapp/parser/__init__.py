@@ -1,4 +1,11 @@
 from .exceptions import *
-from .parser import Parser
-from .manage import add_parser
-from .csvparser import CSVParser
+from ..lazy import lazy_attributes
+
+_lazy = {
+    'Parser': '.parser',
+    'add_parser': '.manage',
+    'CSVParser': '.csvparser',
+}
+
+__getattr__ = lazy_attributes(__name__, _lazy)
+__all__ = exceptions.__all__ + list(_lazy)
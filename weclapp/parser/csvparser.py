@@ -1,10 +1,10 @@
 import sys
 import logging
+import itertools
 
 from datetime import timedelta, datetime
-from dateutil.parser import parse as date_parse
-
 from .parser import Parser
+from .dates import DateParser, LOOKAHEAD_ROWS
 from .exceptions import FailedToParse, InvalidParserOptionFormat
 from ..models import WeclappTimeRecord
 
@@ -24,13 +24,18 @@ class CSVParser(Parser):
 
     The first two lines function as a header. The first and third cells of the
     the header rows are ignored. 'Project ID' and TASK ID have to be the
-    weclapp project number and the project task.
+    weclapp project (the id or the project number) and the project task id.
 
     The date column and the time columns are mandatory. The description column
     may be empty. The date column is parsed with dateutils.parser.parse function.
     If this function parses successfully the date, then this date is used. Please
     take a look at https://dateutil.readthedocs.io/en/stable/parser.html for more
     information about the different strings that are parsed by this function.
+    The format of the date column is detected from the first rows before any row
+    is parsed, all rows are parsed with this format and dateutil is only used for
+    the rows that don't match it. Rows whose date only matches with day and month
+    swapped are reported and ignored. Use the option 'dateFormat' to set the format
+    explicitly, then only this format is accepted.
 
     In the description don't use the character used for separation, this parser
     does not support escaped strings.
@@ -50,28 +55,47 @@ class CSVParser(Parser):
         ('sep', ';', 'The CSV separator'),
         ('timeStart', '09:00', 'The start of the time record'),
         ('encoding', 'utf-8', 'Default file encoding'),
+        ('dateFormat', '', 'strptime format of the date column, detected if empty'),
     ]
 
     def parseFile(self, filename):
-        try:
-            with open(filename, encoding=self.options.encoding) as fp:
-                lines = [ x.strip() for x in fp.readlines() ]
-        except:
-            log.debug('Cannot open the file', exc_info=True)
-            raise FailedToParse('Could not open file')
-
-        if len(lines) < 3:
-            raise FailedToParse('Invalid format, header is missing or first data line is missing')
+        return list(self.iterFile(filename))
 
+    def iterFile(self, filename):
         try:
             timeStart = [ int(x.strip()) for x in self.options.timeStart.split(':') ]
             def_td = timedelta(hours = timeStart[0], minutes = timeStart[1])
         except:
             raise InvalidParserOptionFormat('The parser option \'timeStart\' (\'%s\') is invalid' % self.options.timeStart)
 
-        pinfo = []
+        try:
+            fp = open(filename, encoding=self.options.encoding)
+        except:
+            log.debug('Cannot open the file', exc_info=True)
+            raise FailedToParse('Could not open file')
 
-        headers = [ lines[0].split(self.options.sep), lines[1].split(self.options.sep) ]
+        with fp:
+            try:
+                yield from self.parseLines(filename, fp, def_td, DateParser(self.options.dateFormat))
+            except UnicodeError:
+                log.debug('Cannot read the file', exc_info=True)
+                raise FailedToParse('[%s] Could not read file' % filename)
+
+    def parseLines(self, filename, fp, def_td, dates):
+        """
+        Yields the time records of the lines of fp, the lines are
+        read one by one
+        """
+        lines = ( x.strip() for x in fp )
+
+        headers = []
+        for line in lines:
+            headers.append(line.split(self.options.sep))
+            if len(headers) == 2:
+                break
+
+        if len(headers) < 2:
+            raise FailedToParse('Invalid format, header is missing or first data line is missing')
 
         hl = abs(len(headers[0]) - len(headers[1]))
         if hl > 1:
@@ -95,18 +119,32 @@ class CSVParser(Parser):
 
         hlen = len(headers)
 
-        time_records = []
+        # the date format is chosen before any date is parsed
+        first = list(itertools.islice(lines, LOOKAHEAD_ROWS))
+        dates.detect([ line.split(self.options.sep)[0].strip() for line in first ])
+        if dates.ambiguous:
+            print('[%s] The dates of the first rows match several formats, using %s. Set the parser '
+                    'option dateFormat to use another one' % (filename, dates.fmt), file=sys.stderr)
+
+        linenr = -1
 
-        for linenr,line in enumerate(lines[2:]):
+        for linenr,line in enumerate(itertools.chain(first, lines)):
             cells = [ c.strip() for c in line.split(self.options.sep) ]
             clen = len(cells)
             if clen != (2*hlen +1) and clen != 2*hlen:
-                raise FailedToParse('[%s] Line %s has insufficient data, ignoring' % (filename, linenr+3))
+                msg = '[%s] Line %s has insufficient data, ignoring' % (filename, linenr+3)
+                print(msg, file=sys.stderr)
+                continue
             if clen == 2*hlen:
                 cells.append('')
 
             try:
-                day = date_parse(cells[0]).date()
+                day = dates.parse(cells[0])
+            except ValueError as e:
+                msg = '[%s] Failed to parse time on line %d, ignoring: %s' % (filename, linenr+3, str(e))
+                print(msg, file=sys.stderr)
+                log.debug(msg, exc_info=True)
+                continue
             except:
                 msg = '[%s] Failed to parse time on line %d, ignoring' % (filename, linenr+3)
                 print(msg, file=sys.stderr)
@@ -140,9 +178,13 @@ class CSVParser(Parser):
                     description = desc,
                 )
 
-                time_records.append(WeclappTimeRecord(**tr_args))
+                record = WeclappTimeRecord(**tr_args)
+                record.source = (filename, linenr + 3)
 
-        return time_records
+                yield record
+
+        if linenr == -1:
+            raise FailedToParse('Invalid format, header is missing or first data line is missing')
 
 
 def time_duration(val, def_td):
@@ -0,0 +1,115 @@
+import functools
+
+from datetime import datetime
+
+# strptime formats that are tried when the format of a date column is
+# detected. Month first formats come before day first ones, like the
+# default of dateutil.parser.parse
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    '%Y.%m.%d',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%m.%d.%Y',
+    '%d.%m.%Y',
+    '%m-%d-%Y',
+    '%d-%m-%Y',
+    '%m/%d/%y',
+    '%d/%m/%y',
+    '%m.%d.%y',
+    '%d.%m.%y',
+    '%Y%m%d',
+]
+
+# number of rows whose dates are used to detect the format
+LOOKAHEAD_ROWS = 100
+
+class DateParser(object):
+    """
+    Parses the values of a date column and returns datetime.date objects
+
+    If a format is passed, only this strptime format is accepted.
+    Otherwise detect() chooses the format from the values of the first
+    rows before any value is parsed: the first format of DATE_FORMATS
+    that matches all of them. A day first column is detected when one
+    of these rows has a day greater than 12, if none has, the column is
+    ambiguous and the month first format is used like dateutil does.
+
+    The format never changes while the column is parsed. A value that
+    only matches the format with day and month swapped contradicts it
+    and raises ValueError, values that match no format of DATE_FORMATS
+    are parsed with dateutil.parser.parse. Parsed values are memoized.
+    """
+
+    def __init__(self, fmt=None, cache_size=1024):
+        """
+        params:
+
+            fmt         a strptime format, None or '' to detect the format
+            cache_size  number of memoized values
+        """
+        self.fmt = fmt or None
+        self.pinned = self.fmt is not None
+        self.ambiguous = False
+
+        self.parse = functools.lru_cache(maxsize=cache_size)(self._parse)
+
+    def detect(self, values):
+        """
+        Chooses the format from values, the date cells of the first
+        rows (see LOOKAHEAD_ROWS). Values that match no format are
+        ignored. Sets ambiguous if the remaining formats parse a value
+        differently.
+
+        returns the format, None if no value matches a format
+        """
+        if self.pinned:
+            return self.fmt
+
+        candidates = list(DATE_FORMATS)
+        matched = []
+
+        for value in values:
+            matching = [ fmt for fmt in candidates if strptime_date(value, fmt) is not None ]
+            if len(matching) > 0:
+                candidates = matching
+                matched.append(value)
+
+        if len(matched) == 0:
+            self.fmt = None
+            return None
+
+        self.fmt = candidates[0]
+        self.ambiguous = any(len({ strptime_date(value, fmt) for fmt in candidates }) > 1 for value in matched)
+
+        return self.fmt
+
+    def _parse(self, value):
+        if self.pinned:
+            return datetime.strptime(value, self.fmt).date()
+
+        if self.fmt is not None:
+            day = strptime_date(value, self.fmt)
+            if day is not None:
+                return day
+
+            if strptime_date(value, swap_day_month(self.fmt)) is not None:
+                raise ValueError('\'%s\' contradicts the date format %s of the first rows' % (value, self.fmt))
+
+        from dateutil.parser import parse as date_parse
+        return date_parse(value).date()
+
+
+def strptime_date(value, fmt):
+    """
+    Returns the date of value parsed with fmt, None if it does not match
+    """
+    try:
+        return datetime.strptime(value, fmt).date()
+    except ValueError:
+        return None
+
+
+def swap_day_month(fmt):
+    return fmt.replace('%d', '%_').replace('%m', '%d').replace('%_', '%m')
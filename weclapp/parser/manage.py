@@ -11,13 +11,23 @@ def add_parser(name, parser, default=False):
 
     name must be a unique name
     parser must be a weclapp.Parser class
-    """
-    if name in map(lambda p: p['name'], parsers):
-        raise ParserNameNotUnique('The parser \'%s\' is already in the parser list' % name)
 
+    Adding the same parser again (a plugin loaded again by a long
+    running process) replaces it
+    """
     if not (inspect.isclass(parser) and issubclass(parser, Parser)):
         raise ParserInvalidType('Invalid class. It is not a weclapp.Parser class')
 
+    for p in parsers:
+        if p['name'] != name:
+            continue
+
+        if (p['parser'].__module__, p['parser'].__qualname__) != (parser.__module__, parser.__qualname__):
+            raise ParserNameNotUnique('The parser \'%s\' is already in the parser list' % name)
+
+        p['parser'] = parser
+        return
+
     idx = len(parsers)
     if default:
         idx = 0
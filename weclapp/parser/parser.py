@@ -62,6 +62,25 @@ class Parser(object):
         """
         pass
 
+    def iterFile(self, filename):
+        """
+        parse the file and yield weclapp.WeclappTimeRecord objects as
+        soon as they are parsed.
+
+        params:
+
+          filename   a filename
+
+        If the file cannot be parsed, raise weclapp.FailedToParse
+
+        The default implementation yields the records returned by
+        parseFile(). Override this method in your parser implementation
+        if the records can be parsed one by one, then the upload can
+        start before the whole file is parsed.
+        """
+        for record in self.parseFile(filename) or []:
+            yield record
+
     @classmethod
     def parse_parse_options(cls, pos):
         """
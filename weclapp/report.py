@@ -0,0 +1,73 @@
+from datetime import datetime
+
+class Report(object):
+    """
+    Running totals of the durations of time records grouped by keys.
+
+    Time records are added one by one as returned by the public API
+    (dictionaries), only the totals are kept. Valid keys are 'project',
+    'task', 'user', 'week' and 'month'.
+    """
+
+    groups = ('project', 'task', 'user', 'week', 'month')
+
+    # group key -> API field
+    fields = {
+        'project': 'projectId',
+        'task': 'projectTaskId',
+        'user': 'userId',
+    }
+
+    def __init__(self, keys):
+        for key in keys:
+            if key not in self.groups:
+                raise KeyError('Unknown group key \'%s\'' % key)
+
+        self.keys = tuple(keys)
+        self.totals = {}
+        self.count = 0
+        self.total = 0
+
+    def properties(self):
+        """
+        Returns the API fields needed for the report (the value for the
+        properties parameter)
+        """
+        fields = [ 'durationSeconds', 'startDate' ]
+        fields += [ self.fields[k] for k in self.keys if k in self.fields ]
+        return ','.join(fields)
+
+    def add(self, row):
+        key = tuple(self.value(row, k) for k in self.keys)
+        duration = row['durationSeconds']
+
+        self.totals[key] = self.totals.get(key, 0) + duration
+        self.count += 1
+        self.total += duration
+
+    def add_pages(self, pages):
+        """
+        Adds the time records of every page, pages is an iterable of lists
+        """
+        for page in pages:
+            for row in page:
+                self.add(row)
+
+    def value(self, row, key):
+        field = self.fields.get(key, None)
+        if field is not None:
+            return row.get(field, None)
+
+        start = datetime.fromtimestamp(row['startDate'] // 1000)
+
+        if key == 'week':
+            year, week, _ = start.isocalendar()
+            return '%d-W%02d' % (year, week)
+
+        return '%d-%02d' % (start.year, start.month)
+
+    def rows(self):
+        """
+        Returns the list of (key, seconds) tuples sorted by key
+        """
+        return sorted(self.totals.items(), key=lambda kv: tuple('' if v is None else v for v in kv[0]))
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import stat
+import array
+import socket
+import logging
+
+from .exception import WeclappBaseException
+
+log = logging.getLogger("weclapp-cli")
+
+# the file descriptors passed by the client: stdout and stderr
+PASSED_FDS = (1, 2)
+MAX_REQUEST_SIZE = 1024 * 1024
+
+class DaemonFailed(WeclappBaseException):
+    """
+    Raised when the daemon could not run a command
+    """
+    pass
+
+
+def def_socket_path(config_path):
+    """
+    Returns the path of the socket of the daemon, which is stored next
+    to the configuration file
+    """
+    return os.path.join(os.path.dirname(config_path), 'weclapp-cli.sock')
+
+
+def send_request(path, request):
+    """
+    Sends a request to the daemon listening on the Unix socket path and
+    returns the response. The stdout and stderr of this process are
+    passed to the daemon, the output of the command is written to them.
+
+    returns None if no daemon is listening
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        try:
+            sock.connect(path)
+        except OSError:
+            log.debug('No daemon is listening on %s', path)
+            return None
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        data = (json.dumps(request) + '\n').encode('utf-8')
+        fds = array.array('i', PASSED_FDS)
+        try:
+            sent = sock.sendmsg([ data ], [ (socket.SOL_SOCKET, socket.SCM_RIGHTS, fds) ])
+            if sent < len(data):
+                sock.sendall(data[sent:])
+
+            response = read_line(sock)
+        except OSError as e:
+            raise DaemonFailed('Unable to send the command to the daemon: %s' % str(e))
+    finally:
+        sock.close()
+
+    if response is None:
+        raise DaemonFailed('The daemon closed the connection')
+
+    return json.loads(response)
+
+
+def read_line(sock, data=b''):
+    """
+    Reads from the socket until a newline, returns None if the
+    connection was closed before
+    """
+    while b'\n' not in data:
+        if len(data) > MAX_REQUEST_SIZE:
+            return None
+
+        chunk = sock.recv(65536)
+        if not chunk:
+            return None
+        data += chunk
+
+    return data.split(b'\n', 1)[0].decode('utf-8')
+
+
+class Server(object):
+    """
+    Answers the requests of the weclapp-cli commands over a Unix socket.
+
+    A request is a JSON object terminated by a newline, the client passes
+    its stdout and stderr (SCM_RIGHTS) with it. The handler runs with them
+    as stdout and stderr, so the output goes directly to the terminal of
+    the client. The response is the JSON object returned by the handler.
+
+    The requests are handled one after the other. If the handler raises
+    an exception, the response is { 'error': message, 'status': 1 }.
+    """
+
+    def __init__(self, path, handler):
+        """
+        params:
+
+            path     the path of the Unix socket
+            handler  a function that takes the request and returns the response
+        """
+        self.path = path
+        self.handler = handler
+        self.sock = None
+
+    def listen(self):
+        if os.path.exists(self.path):
+            if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                raise DaemonFailed('%s exists and is not a socket' % self.path)
+
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise DaemonFailed('A daemon is already listening on %s' % self.path)
+            except OSError:
+                # a socket left behind by a daemon that was killed
+                os.unlink(self.path)
+            finally:
+                probe.close()
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        # only the user may connect, the daemon uses the API token
+        umask = os.umask(0o177)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(umask)
+
+        self.sock.listen(16)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def serve_forever(self):
+        if self.sock is None:
+            self.listen()
+
+        try:
+            while True:
+                conn, _ = self.sock.accept()
+                with conn:
+                    try:
+                        self.handle(conn)
+                    except Exception:
+                        log.warning('Failed to handle a request', exc_info=True)
+        finally:
+            self.close()
+
+    def handle(self, conn):
+        fds = array.array('i')
+        data, ancdata, flags, addr = conn.recvmsg(65536, socket.CMSG_SPACE(len(PASSED_FDS) * fds.itemsize))
+
+        for level, kind, cdata in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(cdata[:len(cdata) - (len(cdata) % fds.itemsize)])
+
+        try:
+            line = read_line(conn, data)
+            if line is None or len(fds) != len(PASSED_FDS):
+                log.warning('Invalid request')
+                return
+
+            try:
+                response = self.run(json.loads(line), fds)
+            except Exception as e:
+                # the client must not wait for a response that never comes
+                log.warning('Failed to run a request', exc_info=True)
+                response = { 'error': 'The daemon failed to run the command: %s' % (str(e) or type(e).__name__),
+                        'status': 1 }
+
+            conn.sendall((json.dumps(response) + '\n').encode('utf-8'))
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def run(self, request, fds):
+        """
+        Runs the handler with the passed file descriptors as stdout and stderr
+        """
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        saved = [ os.dup(fd) for fd in PASSED_FDS ]
+        for fd, passed in zip(PASSED_FDS, fds):
+            os.dup2(passed, fd)
+
+        try:
+            return self.handler(request)
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            except OSError:
+                # the client is gone
+                pass
+
+            for fd, old in zip(PASSED_FDS, saved):
+                os.dup2(old, fd)
+                os.close(old)
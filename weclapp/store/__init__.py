@@ -0,0 +1,14 @@
+from .exceptions import *
+from ..lazy import lazy_attributes
+
+_lazy = {
+    'SyncStore': '.sync',
+    'def_store_path': '.sync',
+    'UploadJournal': '.journal',
+    'def_journal_path': '.journal',
+    'ReferenceCache': '.cache',
+    'def_cache_path': '.cache',
+}
+
+__getattr__ = lazy_attributes(__name__, _lazy)
+__all__ = exceptions.__all__ + list(_lazy)
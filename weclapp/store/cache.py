@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .exceptions import StoreFailed
+
+log = logging.getLogger("weclapp-cli")
+
+def def_cache_path(config_path):
+    """
+    Returns the path of the reference data cache, which is stored next
+    to the configuration file
+    """
+    return os.path.join(os.path.dirname(config_path), 'cache.sqlite')
+
+
+class ReferenceCache(object):
+    """
+    A cache of reference data (projects and tasks) stored in a SQLite
+    database and shared between runs.
+
+    The entities of a model class are fetched once and served from the
+    cache for ttl seconds without any request. After that, two tiny
+    requests check whether the entities changed: the /count of the
+    entities and the highest lastModifiedDate. If both are unchanged,
+    the cache is used for another ttl seconds, otherwise all entities
+    of the class are fetched again. Created and modified entities change
+    the highest lastModifiedDate, deleted ones the count.
+
+    load() accepts the same parameters as SyncStore.load(), so the cache
+    can be passed as store to WeclappBaseModel.load()
+    """
+
+    def __init__(self, path, ttl=600, refresh=False, concurrency=1):
+        """
+        params:
+
+            path         the path of the SQLite database
+            ttl          seconds the cached entities are used without a check
+            refresh      if set, the entities are fetched again on first use
+            concurrency  number of pages fetched at the same time
+        """
+        self.path = path
+        self.ttl = ttl
+        self.refresh = refresh
+        self.concurrency = concurrency
+
+        # the model classes checked by this object
+        self.checked = set()
+
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = sqlite3.connect(path)
+            with self.conn:
+                self.conn.execute('CREATE TABLE IF NOT EXISTS reference_cache ('
+                        'entity TEXT PRIMARY KEY, checked REAL NOT NULL, count INTEGER NOT NULL, '
+                        'modified INTEGER, properties TEXT NOT NULL, data TEXT NOT NULL)')
+        except (OSError, sqlite3.Error) as e:
+            raise StoreFailed('Could not open the cache %s: %s' % (path, str(e)))
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def properties(cls):
+        """
+        Returns the properties parameter for the cached entities: the
+        fields of the model and lastModifiedDate
+        """
+        fields = cls.__properties__.split(',')
+        if 'lastModifiedDate' not in fields:
+            fields.append('lastModifiedDate')
+
+        return ','.join(fields)
+
+    def _meta(self, cls):
+        """
+        Returns (checked, count, modified, properties) of the cached
+        entities or None
+        """
+        return self.conn.execute('SELECT checked, count, modified, properties FROM reference_cache '
+                'WHERE entity = ?', (cls.__fetch_command__,)).fetchone()
+
+    def update(self, classes):
+        """
+        Makes sure the cached entities of every model class in classes
+        are up to date. The checks and fetches of the classes run at the
+        same time.
+        """
+        classes = [ cls for cls in classes if cls not in self.checked ]
+        if len(classes) == 0:
+            return
+
+        try:
+            now = time.time()
+            expired = []
+            missing = []
+
+            for cls in classes:
+                meta = self._meta(cls)
+                if self.refresh or meta is None or meta[3] != self.properties(cls):
+                    missing.append(cls)
+                elif now - meta[0] >= self.ttl:
+                    expired.append((cls, meta))
+
+            # the probes of all classes are sent at the same time
+            with ThreadPoolExecutor(max_workers=max(1, 2 * len(expired))) as executor:
+                probes = [ (cls, meta, executor.submit(self.count, cls), executor.submit(self.modified, cls))
+                        for cls, meta in expired ]
+
+                for cls, meta, count, modified in probes:
+                    count, modified = count.result(), modified.result()
+                    if (count, modified) == (meta[1], meta[2]):
+                        log.debug('Cache %s: unchanged', cls.__fetch_command__)
+                        with self.conn:
+                            self.conn.execute('UPDATE reference_cache SET checked = ? WHERE entity = ?',
+                                    (now, cls.__fetch_command__))
+                    else:
+                        log.debug('Cache %s: changed (count %s -> %s, lastModifiedDate %s -> %s)',
+                                cls.__fetch_command__, meta[1], count, meta[2], modified)
+                        missing.append(cls)
+
+            with ThreadPoolExecutor(max_workers=max(1, len(missing))) as executor:
+                fetches = [ (cls, executor.submit(self.fetch, cls)) for cls in missing ]
+
+                for cls, rows in fetches:
+                    self.save(cls, rows.result(), now)
+        except sqlite3.Error as e:
+            raise StoreFailed('Could not update the cache %s: %s' % (self.path, str(e)))
+
+        self.checked.update(classes)
+
+    @staticmethod
+    def count(cls):
+        """
+        Returns the number of entities of the model class
+        """
+        return cls.query().count()
+
+    @staticmethod
+    def modified(cls):
+        """
+        Returns the highest lastModifiedDate of the entities of the
+        model class, fetched with a page of one entity
+        """
+        latest = cls.load_raw(sort='-lastModifiedDate', pageSize=1,
+                params={ 'properties': 'id,lastModifiedDate' })
+
+        if len(latest) == 0:
+            return None
+
+        return latest[0].get('lastModifiedDate')
+
+    def fetch(self, cls):
+        """
+        Fetches all entities of the model class
+        """
+        log.debug('Cache %s: fetching all entities', cls.__fetch_command__)
+        return cls.load_raw(pageSize=-1, concurrency=self.concurrency,
+                params={ 'properties': self.properties(cls) })
+
+    def save(self, cls, rows, now):
+        modified = None
+        for r in rows:
+            lmd = r.get('lastModifiedDate')
+            if lmd is not None and (modified is None or lmd > modified):
+                modified = lmd
+
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO reference_cache '
+                    '(entity, checked, count, modified, properties, data) VALUES (?, ?, ?, ?, ?, ?)',
+                    (cls.__fetch_command__, now, len(rows), modified, self.properties(cls), json.dumps(rows)))
+
+    def load(self, cls, sort=None, pageSize=-1, params=None):
+        """
+        Loads the objects of the model class from the cache, see
+        SyncStore.load(). Filters are not supported.
+        """
+        return [ cls(**r) for r in self.load_raw(cls, sort=sort, pageSize=pageSize, params=params) ]
+
+    def load_raw(self, cls, sort=None, pageSize=-1, params=None):
+        """
+        Like load() but returns the entities as returned by the public
+        API (a list of dictionaries)
+        """
+        for key in (params or {}):
+            if key != 'properties':
+                raise StoreFailed('The cache does not support the filter \'%s\'' % key)
+
+        self.update([ cls ])
+
+        try:
+            row = self.conn.execute('SELECT data FROM reference_cache WHERE entity = ?',
+                    (cls.__fetch_command__,)).fetchone()
+        except sqlite3.Error as e:
+            raise StoreFailed('Could not read the cache %s: %s' % (self.path, str(e)))
+
+        rows = json.loads(row[0])
+
+        if sort:
+            column = sort.lstrip('-')
+            rows.sort(key=lambda r: (r.get(column) is not None, r.get(column)), reverse=sort.startswith('-'))
+
+        if pageSize is not None and pageSize >= 0:
+            rows = rows[:pageSize]
+
+        return rows
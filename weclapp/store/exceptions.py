@@ -0,0 +1,13 @@
+__all__ = [ 'StoreFailed' ]
+
+from ..exception import WeclappBaseException
+
+class WeclappStoreBaseException(WeclappBaseException):
+    pass
+
+
+class StoreFailed(WeclappStoreBaseException):
+    """
+    Raised when the local store cannot be opened, read or written
+    """
+    pass
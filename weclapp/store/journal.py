@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+
+from .exceptions import StoreFailed
+
+log = logging.getLogger("weclapp-cli")
+
+PENDING = 'pending'
+COMMITTED = 'committed'
+
+def def_journal_path(config_path):
+    """
+    Returns the path of the upload journal, which is stored next to
+    the configuration file
+    """
+    return os.path.join(os.path.dirname(config_path), 'journal.sqlite')
+
+
+class UploadJournal(object):
+    """
+    A write-ahead journal of uploaded time records.
+
+    Every record is identified by a hash of its upload payload. Before a
+    record is sent it is marked as pending, after weclapp created it, it
+    is marked as committed together with the id returned by the server.
+    Committed records are skipped when the same records are uploaded
+    again, pending records (failed or interrupted uploads) are sent again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = sqlite3.connect(path)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            with self.conn:
+                self.conn.execute('CREATE TABLE IF NOT EXISTS upload_journal ('
+                        'key TEXT PRIMARY KEY, state TEXT NOT NULL, serverId TEXT, '
+                        'updated REAL NOT NULL, data TEXT NOT NULL)')
+        except (OSError, sqlite3.Error) as e:
+            raise StoreFailed('Could not open the upload journal %s: %s' % (path, str(e)))
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def key(record):
+        """
+        Returns the content hash of the time record
+        """
+        data = json.dumps(record.dict_for_upload(), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def state(self, key):
+        """
+        Returns a tuple (state, serverId), (None, None) if the key is
+        not in the journal
+        """
+        try:
+            row = self.conn.execute('SELECT state, serverId FROM upload_journal WHERE key = ?',
+                    (key,)).fetchone()
+        except sqlite3.Error as e:
+            raise StoreFailed('Could not read the upload journal %s: %s' % (self.path, str(e)))
+
+        if row is None:
+            return (None, None)
+
+        return row
+
+    def is_committed(self, key):
+        return self.state(key)[0] == COMMITTED
+
+    def begin(self, key, record):
+        """
+        Marks the record as pending
+        """
+        data = json.dumps(record.dict_for_upload(), sort_keys=True)
+        self._write('INSERT OR REPLACE INTO upload_journal (key, state, serverId, updated, data) '
+                'VALUES (?, ?, NULL, ?, ?)', (key, PENDING, time.time(), data))
+
+    def commit(self, key, serverId):
+        """
+        Marks the record as uploaded, serverId is the id weclapp
+        assigned to the new time record
+        """
+        self._write('UPDATE upload_journal SET state = ?, serverId = ?, updated = ? WHERE key = ?',
+                (COMMITTED, serverId, time.time(), key))
+
+    def _write(self, sql, args):
+        try:
+            with self.conn:
+                self.conn.execute(sql, args)
+        except sqlite3.Error as e:
+            raise StoreFailed('Could not write the upload journal %s: %s' % (self.path, str(e)))
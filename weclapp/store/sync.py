@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+from .exceptions import StoreFailed
+
+log = logging.getLogger("weclapp-cli")
+
+# maximal number of passes that check the fetched changes, see
+# SyncStore._fetch_changes()
+SYNC_PASSES = 3
+
+def def_store_path(config_path):
+    """
+    Returns the path of the local store, which is stored next to
+    the configuration file
+    """
+    return os.path.join(os.path.dirname(config_path), 'store.sqlite')
+
+
+class SyncStore(object):
+    """
+    A local copy of weclapp entities stored in a SQLite database.
+
+    sync() only fetches the entities that changed since the last sync
+    (the watermark is the highest lastModifiedDate seen so far) and
+    merges them into the local copy. A full id reconciliation removes
+    the deleted entities and fetches the ones missing locally, it runs
+    when the last one is older than reconcile_interval hours.
+
+    The loaded objects are served by load(), which accepts the same
+    sort and pageSize parameters as WeclappBaseModel.load()
+    """
+
+    # columns that can be used for sorting and filtering
+    sort_columns = [ 'id', 'lastModifiedDate', 'startDate' ]
+
+    # API filter operators supported by load()
+    filter_operators = {
+        'eq': '=',
+        'ne': '!=',
+        'gt': '>',
+        'ge': '>=',
+        'lt': '<',
+        'le': '<=',
+    }
+
+    def __init__(self, path, reconcile_interval=24):
+        self.path = path
+        self.reconcile_interval = reconcile_interval
+
+        try:
+            # ':memory:' creates a store that is not saved
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = sqlite3.connect(path)
+            with self.conn:
+                self.conn.execute('CREATE TABLE IF NOT EXISTS sync_meta ('
+                        'entity TEXT PRIMARY KEY, watermark INTEGER, reconciled REAL)')
+        except (OSError, sqlite3.Error) as e:
+            raise StoreFailed('Could not open the local store %s: %s' % (path, str(e)))
+
+    def close(self):
+        self.conn.close()
+
+    def _table(self, cls):
+        """
+        Creates the table for the model class if needed and returns its name
+        """
+        table = cls.__fetch_command__
+        self.conn.execute('CREATE TABLE IF NOT EXISTS "%s" ('
+                'id TEXT PRIMARY KEY, lastModifiedDate INTEGER, startDate INTEGER, '
+                'data TEXT NOT NULL)' % table)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS "%s_startDate" ON "%s" (startDate)' % (table, table))
+
+        return table
+
+    def _meta(self, cls):
+        row = self.conn.execute('SELECT watermark, reconciled FROM sync_meta WHERE entity = ?',
+                (cls.__fetch_command__,)).fetchone()
+
+        if row is None:
+            return (None, None)
+
+        return row
+
+    def sync(self, classes, reconcile=False, concurrency=1):
+        """
+        Synchronizes the local copy of every model class in classes
+
+        params:
+
+            classes      list of weclapp models, e.g. [ WeclappProject, WeclappTask ]
+            reconcile    if set, force a full id reconciliation
+            concurrency  number of pages fetched at the same time
+        """
+        try:
+            for cls in classes:
+                self.sync_model(cls, reconcile=reconcile, concurrency=concurrency)
+        except sqlite3.Error as e:
+            raise StoreFailed('Could not update the local store %s: %s' % (self.path, str(e)))
+
+    def sync_model(self, cls, reconcile=False, concurrency=1):
+        table = self._table(cls)
+        watermark, reconciled = self._meta(cls)
+
+        params = {}
+        if watermark is not None:
+            # -ge instead of -gt, entities modified within the same
+            # millisecond as the watermark are fetched again
+            params['lastModifiedDate-ge'] = watermark
+
+        # only the fields of the model, lastModifiedDate is needed for
+        # the watermark
+        fields = cls.__properties__.split(',')
+        if 'lastModifiedDate' not in fields:
+            fields.append('lastModifiedDate')
+        properties = ','.join(fields)
+
+        rows, stable = self._fetch_changes(cls, params, properties, concurrency)
+
+        log.debug('Sync %s: %d changed entities since %s', table, len(rows), watermark)
+
+        now = time.time()
+        if reconciled is None or now - reconciled >= self.reconcile_interval * 3600:
+            reconcile = True
+
+        ids = None
+        missing = []
+        if reconcile and watermark is not None:
+            ids = cls.load_raw(pageSize=-1, concurrency=concurrency,
+                    params={ 'properties': 'id' })
+            ids = set(r['id'] for r in ids)
+
+            # entities that were skipped by an earlier sync
+            local = set(r[0] for r in self.conn.execute('SELECT id FROM "%s"' % table))
+            missing = cls.load_in_raw('id', ids - local - set(rows), concurrency=concurrency,
+                    params={ 'properties': properties })
+            log.debug('Sync %s: adding %d missing entities', table, len(missing))
+
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO "%s" (id, lastModifiedDate, startDate, data) '
+                    'VALUES (?, ?, ?, ?)' % table,
+                    [ (r['id'], r.get('lastModifiedDate'), r.get('startDate'), json.dumps(r))
+                        for r in list(rows.values()) + missing ])
+
+            if stable:
+                for r in rows.values():
+                    lmd = r.get('lastModifiedDate')
+                    if lmd is not None and (watermark is None or lmd > watermark):
+                        watermark = lmd
+            else:
+                log.debug('Sync %s: entities changed during every pass, keeping the watermark', table)
+
+            if ids is not None:
+                local = [ r[0] for r in self.conn.execute('SELECT id FROM "%s"' % table) ]
+                deleted = [ (i,) for i in local if i not in ids ]
+                log.debug('Sync %s: removing %d deleted entities', table, len(deleted))
+                self.conn.executemany('DELETE FROM "%s" WHERE id = ?' % table, deleted)
+
+            if reconcile:
+                reconciled = now
+
+            self.conn.execute('INSERT OR REPLACE INTO sync_meta (entity, watermark, reconciled) '
+                    'VALUES (?, ?, ?)', (cls.__fetch_command__, watermark, reconciled))
+
+    def _fetch_changes(self, cls, params, properties, concurrency):
+        """
+        Fetches the entities matching params and returns a tuple (rows,
+        stable). rows is a dictionary id -> entity.
+
+        The pages are sorted by the id, which does not change. Entities
+        that are modified or deleted while the pages are fetched still
+        move pages, so the query is repeated with only the id and the
+        lastModifiedDate of the entities (and the changed entities are
+        fetched again) until a pass returns no changes. stable is False
+        if every one of SYNC_PASSES passes returned changes, the
+        watermark must not be advanced then.
+        """
+        rows = cls.load_raw(sort='id', pageSize=-1, concurrency=concurrency,
+                params=dict(params, properties=properties))
+        rows = { r['id']: r for r in rows }
+        seen = { i: r.get('lastModifiedDate') for i, r in rows.items() }
+
+        versions_params = dict(params, properties='id,lastModifiedDate')
+
+        for _ in range(SYNC_PASSES):
+            versions = cls.load_raw(sort='id', pageSize=-1, concurrency=concurrency, params=versions_params)
+            versions = { r['id']: r.get('lastModifiedDate') for r in versions }
+
+            if versions == seen:
+                return (rows, True)
+
+            changed = [ i for i, lmd in versions.items() if seen.get(i, None) != lmd ]
+            changed = cls.load_in_raw('id', changed, concurrency=concurrency,
+                    params={ 'properties': properties })
+
+            rows.update((r['id'], r) for r in changed)
+            # the other entities were deleted (or skipped by this pass,
+            # then they are fetched again by the next one)
+            rows = { i: r for i, r in rows.items() if i in versions }
+            seen = versions
+
+        return (rows, False)
+
+    def load(self, cls, sort=None, pageSize=-1, params=None):
+        """
+        Loads the objects of the model class from the local copy
+
+        params:
+
+            sort      the sort parameter, a column name with an optional
+                      '-' prefix for descending order
+            pageSize  number of elements, -1 loads all elements
+            params    API filters like {'startDate-ge': 1550000000000}, only
+                      the columns of sort_columns and the operators of
+                      filter_operators are supported
+        """
+        return [ cls(**r) for r in self.load_raw(cls, sort=sort, pageSize=pageSize, params=params) ]
+
+    def load_raw(self, cls, sort=None, pageSize=-1, params=None):
+        """
+        Like load() but returns the entities as returned by the public
+        API (a list of dictionaries)
+        """
+        where = []
+        args = []
+
+        for key, value in (params or {}).items():
+            if key == 'properties':
+                # the whole entities are stored
+                continue
+
+            column, _, op = key.rpartition('-')
+            if column not in self.sort_columns or op not in self.filter_operators:
+                raise StoreFailed('The local store does not support the filter \'%s\'' % key)
+
+            where.append('%s %s ?' % (column, self.filter_operators[op]))
+            args.append(value)
+
+        try:
+            table = self._table(cls)
+
+            sql = 'SELECT data FROM "%s"' % table
+
+            if where:
+                sql = '%s WHERE %s' % (sql, ' AND '.join(where))
+
+            if sort:
+                column = sort.lstrip('-')
+                if column in self.sort_columns:
+                    order = 'DESC' if sort.startswith('-') else 'ASC'
+                    sql = '%s ORDER BY %s %s' % (sql, column, order)
+
+            if pageSize is not None and pageSize >= 0:
+                sql = '%s LIMIT %d' % (sql, pageSize)
+
+            rows = self.conn.execute(sql, args).fetchall()
+        except sqlite3.Error as e:
+            raise StoreFailed('Could not read the local store %s: %s' % (self.path, str(e)))
+
+        return [ json.loads(r[0]) for r in rows ]
@@ -0,0 +1,348 @@
+import sys
+import time
+import logging
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("weclapp-cli")
+
+class UploadResult(object):
+    """
+    The result of uploading one time record
+
+        record     the uploaded weclapp.WeclappTimeRecord
+        uploaded   the time record created by weclapp, None on failure
+        status     the HTTP status code, None if no response was received
+        error      the exception raised by the upload, None on success
+    """
+
+    def __init__(self, record, uploaded=None, status=None, error=None):
+        self.record = record
+        self.uploaded = uploaded
+        self.status = status
+        self.error = error
+
+    @property
+    def success(self):
+        return self.uploaded is not None
+
+
+class DuplicateIndex(object):
+    """
+    An index of time records on (projectId, projectTaskId, startDate, durationSeconds)
+    used to detect time records that already exist in weclapp
+    """
+
+    def __init__(self, records=[]):
+        self.keys = set()
+
+        for record in records:
+            self.add(record)
+
+    @staticmethod
+    def key(record):
+        # parsed records have no milliseconds, the API might add them
+        return (record.projectId, record.projectTaskId, record.millis('startDate') // 1000, record.durationSeconds)
+
+    def add(self, record):
+        self.keys.add(self.key(record))
+
+    def __contains__(self, record):
+        return self.key(record) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, records, concurrency=1, store=None):
+        """
+        Fetches the existing time records in the date range covered by
+        records and returns the index. If store is set, the records are
+        loaded from this weclapp.SyncStore.
+        """
+        from .models import WeclappTimeRecord # avoiding circle dependencies
+
+        if len(records) == 0:
+            return cls()
+
+        starts = [ r.millis('startDate') for r in records ]
+
+        params = {
+            'startDate-ge': min(starts),
+            'startDate-le': max(starts),
+        }
+
+        return cls(WeclappTimeRecord.load(pageSize=-1, concurrency=concurrency, params=params, store=store))
+
+    def split(self, records):
+        """
+        Returns a tuple (unique, duplicates). The unique records are
+        added to the index, so duplicates within records are found as well.
+        """
+        unique = []
+        duplicates = []
+
+        for record in records:
+            if record in self:
+                duplicates.append(record)
+                continue
+
+            self.add(record)
+            unique.append(record)
+
+        return (unique, duplicates)
+
+
+class ProjectIndex(object):
+    """
+    An index of the projects (by id and by project number) and the tasks
+    (by id) used to check time records before they are uploaded
+    """
+
+    def __init__(self, projects=[], tasks=[]):
+        self.projects = { p.id: p for p in projects }
+        self.numbers = { p.projectNumber: p for p in projects }
+        self.tasks = { t.id: t for t in tasks }
+
+    @classmethod
+    def load(cls, store=None):
+        """
+        Loads all projects and tasks and returns the index. If store is
+        set, they are loaded from this weclapp.SyncStore or
+        weclapp.store.ReferenceCache.
+        """
+        from .models import WeclappProject, WeclappTask # avoiding circle dependencies
+
+        projects = WeclappProject.load(tasks=False, pageSize=-1, store=store)
+        tasks = WeclappTask.load(pageSize=-1, store=store)
+
+        return cls(projects, tasks)
+
+    def check(self, record):
+        """
+        Checks the project and the task of the time record. A project
+        number is replaced by the id of the project.
+
+        returns None if the record can be uploaded, the reason otherwise
+        """
+        project = self.projects.get(record.projectId, None)
+        if project is None:
+            project = self.numbers.get(record.projectId, None)
+            if project is None:
+                return 'there is no project with the id or number \'%s\'' % record.projectId
+
+            record.projectId = project.id
+
+        task = self.tasks.get(record.projectTaskId, None)
+        if task is None:
+            return 'there is no task with the id \'%s\'' % record.projectTaskId
+
+        if task.projectId != project.id:
+            return 'the task %s belongs to the project %s, not to %s' % (task.id, task.projectId, project.id)
+
+        if not task.allowTimeTracking:
+            return 'the task %s does not allow time tracking' % task.id
+
+        return None
+
+
+class Progress(object):
+    """
+    Prints the progress and the throughput of an upload on a single line.
+    Nothing is printed when file is not a terminal.
+    """
+
+    def __init__(self, total=None, file=sys.stderr):
+        self.total = total
+        self.file = file
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+
+        # a line rewritten with \r only litters log files and pipes
+        self.enabled = file.isatty()
+
+        # the length of the line currently shown, 0 if none
+        self.width = 0
+
+    def update(self, result):
+        self.done += 1
+        if not result.success:
+            self.failed += 1
+
+        if not self.enabled:
+            return
+
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+
+        total = '' if self.total is None else '/%d' % self.total
+        line = 'Uploaded %d%s time records, %d failed (%.1f records/s)' % (self.done, total, self.failed, rate)
+        print('\r' + line.ljust(self.width), end='', file=self.file, flush=True)
+        self.width = len(line)
+
+    def clear(self):
+        """
+        Removes the progress line, so that a message can be printed. The
+        next update shows it again.
+        """
+        if self.width > 0:
+            print('\r%s\r' % (' ' * self.width), end='', file=self.file, flush=True)
+            self.width = 0
+
+    def finish(self):
+        if self.width > 0:
+            print('', file=self.file, flush=True)
+            self.width = 0
+
+
+class Uploader(object):
+    """
+    Uploads time records with a bounded number of concurrent workers.
+
+    At most 2 * workers uploads are queued at any time, so records can be
+    passed as a generator without holding all of them in memory.
+
+    With a batch_size greater than 1, every worker sends batch_size records
+    over one connection without waiting for the responses (pipelining, see
+    weclapp.asyncapi.AsyncWeclappAPI.call_batch). The records are uploaded
+    with WeclappTimeRecord.__async_api__, which must be set.
+    """
+
+    def __init__(self, workers=4, progress=None, batch_size=1):
+        """
+        params:
+
+            workers     number of concurrent uploads (connections)
+            progress    a weclapp.uploader.Progress object or None
+            batch_size  number of records a worker sends at once
+        """
+        self.workers = max(1, workers)
+        self.progress = progress
+        self.batch_size = max(1, batch_size)
+
+    def upload_record(self, record):
+        """
+        Uploads a single record and returns the UploadResult
+        """
+        try:
+            return UploadResult(record, uploaded=record.upload(), status=201)
+        except Exception as e:
+            log.debug('Failed to upload the time record', exc_info=True)
+            return UploadResult(record, status=getattr(e, 'status', None), error=e)
+
+    def run(self, records):
+        """
+        Uploads the records and yields an UploadResult for every record
+        in the order of records. records can be any iterable, it is
+        consumed while the uploads are running.
+        """
+        if self.batch_size > 1:
+            yield from self.run_batches(records)
+            return
+
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for record in records:
+                    pending.append(executor.submit(self.upload_record, record))
+
+                    if len(pending) >= 2 * self.workers:
+                        yield self._done(pending.popleft())
+            except Exception:
+                # records failed (e.g. a parser error), the uploads that
+                # were already sent are reported before the error is raised
+                while pending:
+                    yield self._done(pending.popleft())
+                raise
+
+            while pending:
+                yield self._done(pending.popleft())
+
+        if self.progress is not None:
+            self.progress.finish()
+
+    def run_batches(self, records):
+        """
+        Like run(), but the records are collected until every worker
+        has a full batch, then the batches are uploaded at the same time
+        """
+        import asyncio
+        from .models import WeclappTimeRecord # avoiding circle dependencies
+
+        loop = asyncio.new_event_loop()
+        chunk = []
+
+        try:
+            try:
+                for record in records:
+                    chunk.append(record)
+
+                    if len(chunk) >= self.workers * self.batch_size:
+                        yield from self.upload_chunk(loop, chunk)
+                        chunk = []
+            except Exception:
+                # like run(): the records that were already read are
+                # uploaded before the error is raised
+                yield from self.upload_chunk(loop, chunk)
+                raise
+
+            yield from self.upload_chunk(loop, chunk)
+        finally:
+            if WeclappTimeRecord.__async_api__ is not None:
+                WeclappTimeRecord.__async_api__.close()
+            loop.close()
+
+        if self.progress is not None:
+            self.progress.finish()
+
+    def upload_chunk(self, loop, records):
+        """
+        Uploads the records in batches of batch_size at the same time and
+        yields an UploadResult for every record in the order of records
+        """
+        import asyncio
+        from .models import WeclappTimeRecord # avoiding circle dependencies
+
+        async def upload_batch(batch):
+            try:
+                return await WeclappTimeRecord.upload_batch_async(batch)
+            except Exception as e:
+                log.debug('Failed to upload the time records', exc_info=True)
+                return [ e ] * len(batch)
+
+        batches = [ records[i:i + self.batch_size] for i in range(0, len(records), self.batch_size) ]
+        if len(batches) == 0:
+            return
+
+        async def upload_all():
+            return await asyncio.gather(*[ upload_batch(batch) for batch in batches ])
+
+        uploaded = loop.run_until_complete(upload_all())
+
+        for batch, results in zip(batches, uploaded):
+            for record, res in zip(batch, results):
+                if isinstance(res, Exception):
+                    log.debug('Failed to upload the time record: %s', str(res))
+                    result = UploadResult(record, status=getattr(res, 'status', None), error=res)
+                else:
+                    result = UploadResult(record, uploaded=res, status=201)
+
+                yield self._report(result)
+
+    def upload(self, records):
+        """
+        Uploads the records and returns the list of UploadResult objects
+        """
+        return list(self.run(records))
+
+    def _done(self, future):
+        return self._report(future.result())
+
+    def _report(self, result):
+        if self.progress is not None:
+            self.progress.update(result)
+
+        return result